@@ -0,0 +1,271 @@
+"""
+Benchmarks of polender's scene-building and animation hot paths.
+
+Every benchmark is run on a fresh empty scene for a sweep of sizes
+(beads, hooks, loops or objects), recording the wall time, the peak memory
+and, in a second run under polender.profiling, the number of operator
+calls and RNA method calls (keyframe_insert, frame_set, foreach_set, ...).
+Results are written as JSON, and can be compared against an earlier run.
+
+Run in background Blender:
+    blender -b --factory-startup --python benchmarks/bench_polender.py -- --out results.json
+or with the bpy Python module:
+    python benchmarks/bench_polender.py --out results.json
+
+Compare two runs:
+    python benchmarks/bench_polender.py --compare old.json new.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import traceback
+import subprocess
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+DEFAULT_SIZES = [10**2, 10**3, 10**4, 10**5, 10**6]
+
+
+# benchmarks: name -> (setup(n) returning the function to time, largest default size)
+BENCHMARKS = {}
+
+
+def benchmark(max_n):
+    def register(setup):
+        BENCHMARKS[setup.__name__.replace('bench_', '')] = (setup, max_n)
+        return setup
+    return register
+
+
+def _random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(size=(n, 3)), axis=0)
+
+
+def _add_empties(n):
+    import bpy
+    objs = []
+    for i in range(n):
+        obj = bpy.data.objects.new(f'empty_{i}', None)
+        obj.location = (i * 4.0, 0.0, 0.0)
+        bpy.context.scene.collection.objects.link(obj)
+        objs.append(obj)
+    return objs
+
+
+@benchmark(max_n=10**6)
+def bench_add_curve(n):
+    import polender.objects
+    coords = _random_walk(n)
+    return lambda: polender.objects.add_curve(coords)
+
+
+@benchmark(max_n=10**4)
+def bench_add_spheres(n):
+    import polender.objects
+    coords = _random_walk(n)
+    return lambda: polender.objects.add_spheres(coords, radius=0.5, collection='spheres')
+
+
+@benchmark(max_n=10**4)
+def bench_make_hooked_chain(n):
+    import polender.animate_extrusion as ae
+    return lambda: ae.make_hooked_chain(n, 4.0)
+
+
+@benchmark(max_n=10**3)
+def bench_animate_looparray_extrusion(n):
+    import polender.animate_extrusion as ae
+    hooks = _add_empties(10 * n + 10)
+    loops_traj = [{10 * i: None, 10 * i + 50: (10 * i + 2, 10 * i + 9)}
+                  for i in range(n)]
+    return lambda: ae.animate_looparray_extrusion(
+        hooks, loops_traj, step=4.0, n_intermediate_keyframes=1)
+
+
+@benchmark(max_n=10**5)
+def bench_animate_linear_shift(n):
+    import polender.dynamics
+    objs = _add_empties(n)
+    return lambda: polender.dynamics.animate_linear_shift(objs, (0, 10, 0), (1, 100))
+
+
+@benchmark(max_n=10**5)
+def bench_add_fcurve_noise(n):
+    import polender.dynamics
+    objs = _add_empties(n)
+    return lambda: polender.dynamics.add_fcurve_noise(objs)
+
+
+def reset_scene():
+    import bpy
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    try:
+        import polender.constraints
+        polender.constraints.get_constraint_index().clear()
+    except ImportError:
+        pass
+    gc.collect()
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_one(name, n, count_calls=True):
+    setup, _ = BENCHMARKS[name]
+
+    reset_scene()
+    fn = setup(n)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    wall_time = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'benchmark': name,
+        'n': n,
+        'wall_time': wall_time,
+        'peak_python_bytes': peak,
+        'max_rss_bytes': _max_rss(),
+    }
+
+    if count_calls:
+        import polender.profiling
+        reset_scene()
+        fn = setup(n)
+        with polender.profiling.profile() as prof:
+            fn()
+        operators = {k: c for k, (c, _) in prof.summary(kinds=('operator',)).items()}
+        rna = {k: c for k, (c, _) in prof.summary(kinds=('rna',)).items()}
+        result['operator_calls'] = sum(operators.values())
+        result['rna_calls'] = sum(rna.values())
+        result['operators'] = operators
+        result['rna'] = rna
+    return result
+
+
+def metadata():
+    import bpy
+    import polender.buildcache
+    try:
+        git_rev = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        git_rev = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'blender': bpy.app.version_string,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_rev': git_rev,
+        'polender': polender.buildcache.polender_fingerprint(),
+    }
+
+
+def run(names, sizes, max_seconds, count_calls, count_max_n, out):
+    report = {'meta': metadata(), 'results': []}
+    for name in names:
+        _, max_n = BENCHMARKS[name]
+        for n in sizes:
+            if n > max_n:
+                break
+            try:
+                result = run_one(name, n, count_calls=count_calls and n <= count_max_n)
+            except Exception:
+                # report the failure and go on with the next benchmark
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                error = traceback.format_exc()
+                report['results'].append({'benchmark': name, 'n': n, 'error': error})
+                print(f'{name:32s} n={n:<8d} failed:\n{error}', flush=True)
+                if out is not None:
+                    with open(out, 'w') as f:
+                        json.dump(report, f, indent=2)
+                break
+            report['results'].append(result)
+            print(f'{name:32s} n={n:<8d} {result["wall_time"]:10.3f}s '
+                  f'peak {result["peak_python_bytes"] / 2**20:8.1f} MiB '
+                  f'ops {result.get("operator_calls", "-")} '
+                  f'rna {result.get("rna_calls", "-")}', flush=True)
+            # write after every run, so that a crash keeps what was measured
+            if out is not None:
+                with open(out, 'w') as f:
+                    json.dump(report, f, indent=2)
+            if result['wall_time'] > max_seconds:
+                # the next size would take ~10x longer
+                break
+    return report
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_results = {(r['benchmark'], r['n']): r for r in old['results'] if 'error' not in r}
+    print(f'{"benchmark":32s} {"n":>8s} {"old":>10s} {"new":>10s} {"ratio":>7s}')
+    for r in new['results']:
+        o = old_results.get((r['benchmark'], r['n']))
+        if o is None or 'error' in r:
+            continue
+        ratio = r['wall_time'] / o['wall_time'] if o['wall_time'] > 0 else float('nan')
+        print(f'{r["benchmark"]:32s} {r["n"]:8d} {o["wall_time"]:10.3f} '
+              f'{r["wall_time"]:10.3f} {ratio:7.2f}')
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--out', default='polender_benchmarks.json',
+                        help='path of the JSON results')
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS),
+                        choices=list(BENCHMARKS))
+    parser.add_argument('--sizes', nargs='+', type=float, default=DEFAULT_SIZES)
+    parser.add_argument('--max-seconds', type=float, default=60.0,
+                        help='stop sweeping a benchmark once a run takes longer')
+    parser.add_argument('--no-counts', action='store_true',
+                        help='skip the profiled run counting operator and RNA calls')
+    parser.add_argument('--count-max-n', type=float, default=10**4,
+                        help='largest size for the profiled run')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare the wall times of two result files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    run(args.benchmarks,
+        sorted(int(n) for n in args.sizes),
+        max_seconds=args.max_seconds,
+        count_calls=not args.no_counts,
+        count_max_n=int(args.count_max_n),
+        out=args.out)
+
+
+if __name__ == '__main__':
+    main()
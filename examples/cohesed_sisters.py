@@ -14,14 +14,12 @@ import pip
 # pip.main('uninstall polykit'.split())
 # pip.main('install /Users/anton.goloborodko/src/polykit/ -U'.split())
 
-import polykit
-import polykit.io
-import polykit.io.fetch_hoomd
-importlib.reload(polykit.io.fetch_hoomd)
 
 sys.path.append('./')
 import polender
+import polender.io
 importlib.reload(polender)
+importlib.reload(polender.io)
 
 SCALE_FACTOR = 0.01
 THICKNESS = 0.5
@@ -31,13 +29,11 @@ bpy.P.polender = polender
 
 path = './trajectory.gsd'
 
-bpy.P.snap = polykit.io.fetch_hoomd.fetch_snaphot(
-    path,
-    frame_idx=-1
-)
+bpy.P.traj = polender.io.GSDTrajectory(path)
+bpy.P.snap = bpy.P.traj.snapshot(-1)
 
 
-bpy.P.d, bpy.P.chains = polykit.io.fetch_hoomd.unwrap_chains(bpy.P.snap, bond_types=['polymer'])
+bpy.P.d, bpy.P.chains = polender.io.unwrap_chains(bpy.P.snap, bond_types=['polymer'])
 
 bpy.P.d *= SCALE_FACTOR
 
@@ -15,14 +15,14 @@ import pip
 # pip.main('uninstall polykit'.split())
 # pip.main('install /Users/anton.goloborodko/src/polykit/ -U'.split())
 
-import polykit
-import polykit.io
-import polykit.io.fetch_hoomd
-importlib.reload(polykit.io.fetch_hoomd)
 
 sys.path.append('./')
 import polender
+import polender.io
+import polender.geoutils
 importlib.reload(polender)
+importlib.reload(polender.io)
+importlib.reload(polender.geoutils)
 
 SCALE_FACTOR = 0.01
 THICKNESS = 1.0
@@ -33,30 +33,18 @@ bpy.P.polender = polender
 
 path = './traj.gsd'
 
-bpy.P.snap = polykit.io.fetch_hoomd.fetch_snaphot(
-    path,
-    #frame_idx=-1
-    frame_idx=41,
+bpy.P.traj = polender.io.GSDTrajectory(path)
+bpy.P.snap = bpy.P.traj.snapshot(
+    #-1
+    41
 )
 
 
-bpy.P.d, bpy.P.chains = polykit.io.fetch_hoomd.unwrap_chains(bpy.P.snap, bond_types=['chain_bond'])
+bpy.P.d, bpy.P.chains = polender.io.unwrap_chains(bpy.P.snap, bond_types=['chain_bond'])
 bpy.P.d = bpy.P.d - bpy.P.d.mean(axis=0)
 
 
-def pca_align(d):
-    # Center the data by subtracting the mean
-    d_centered = d - np.mean(d, axis=0)
-
-    # Perform SVD
-    U, S, Vt = np.linalg.svd(d_centered, full_matrices=False)
-
-    # Project the data onto the first 3 principal components
-    d_pcad = np.dot(d_centered, Vt.T[:, :3])
-
-    return d_pcad
-
-bpy.P.d = pca_align(bpy.P.d)
+bpy.P.d = polender.geoutils.pca_align(bpy.P.d)
 bpy.P.d = bpy.P.d[:, [2,1,0]]
 
 bpy.P.d *= SCALE_FACTOR
@@ -159,9 +159,11 @@ COHESION_BONDS = [
 
 for i, j in COHESION_BONDS:
     ae.add_distance_constraint(
-        hooks1[i], hooks2[j], distance=STEP/2, influence=COHESIN_INFLUENCE)
+        hooks1[i], hooks2[j], distance=STEP/2, influence=COHESIN_INFLUENCE,
+        tags={'role': 'cohesion', 'bond': (i, j)})
     ae.add_distance_constraint(
-        hooks2[j], hooks1[i], distance=STEP/2, influence=COHESIN_INFLUENCE)
+        hooks2[j], hooks1[i], distance=STEP/2, influence=COHESIN_INFLUENCE,
+        tags={'role': 'cohesion', 'bond': (i, j)})
 
 
 
@@ -212,11 +214,11 @@ polender.dynamics.animate_linear_shift(
 
 
 
-hooks1 = list(polender.utils.discover_objects(
-    'hook_{}_empty1', obj_type='EMPTY').values())
-
-hooks2 = list(polender.utils.discover_objects(
-    'hook_{}_empty2', obj_type='EMPTY').values())
+hooks1 = polender.utils.discover_hooks('hooked_chain_1')
+hooks2 = polender.utils.discover_hooks('hooked_chain_2')
+# or, for chains built before hooks were stamped:
+# hooks1 = list(polender.utils.discover_objects(
+#     'hook_{}_empty1', obj_type='EMPTY', pattern_type='numbers').values())
 
 
 chain1 = bpy.data.objects['chain1']
@@ -232,6 +234,8 @@ print(smcs)
 
 ae.disable_constraints(hooks1)
 ae.disable_constraints(hooks2)
+# or, for the constraints created by polender only:
+# ae.disable_constraints(None, tags={'role': ['chain_bond', 'cohesion', 'loop']})
 polender.dynamics.add_fcurve_noise(hooks1, strength=10.0, scale=10.0)
 polender.dynamics.add_fcurve_noise(hooks2, strength=10.0, scale=10.0)
 polender.dynamics.add_fcurve_noise(smcs, strength=3.0, scale=10.0)
@@ -1 +1,35 @@
-from . import animate_extrusion, dynamics, geoutils, modifiers, objects, utils
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first access, so that the NumPy-only modules
+# (loops, geoutils, io, isosurface, interpolate, framecache, commands, render,
+# spatial) can be imported without Blender, e.g. in multiprocessing workers.
+_SUBMODULES = (
+    'animate_extrusion',
+    'buildcache',
+    'commands',
+    'constraints',
+    'dynamics',
+    'framecache',
+    'geoutils',
+    'interpolate',
+    'io',
+    'isosurface',
+    'loops',
+    'modifiers',
+    'objects',
+    'profiling',
+    'render',
+    'spatial',
+    'streaming',
+    'utils',
+)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_SUBMODULES))
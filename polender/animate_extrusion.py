@@ -2,12 +2,16 @@ import numpy as np
 
 import bpy
 import re
-import math
 import functools
 
 from mathutils import Vector
 
-from .dynamics import animate_linear_shift, get_obj_loc
+from .commands import CommandBuffer
+from .dynamics import (
+    animate_linear_shift, get_obj_loc, set_fcurve_keyframes, ensure_action, fcurve_map)
+from .loops import LoopTrajectory, loop_layout, schedule_extrusion
+from .utils import discover_hook_modifiers, stamp_hook, stamp_hook_modifiers
+from .constraints import register_constraint, set_constraints, toggle_constraints
 
 
 def make_hooked_chain(
@@ -49,6 +53,7 @@ def make_hooked_chain(
     obj.select_set(True)
 
     hook_empties = []
+    hook_mod_names = []
     hooks_collection = bpy.data.collections.new('hooks' + subobj_suffix)
     hooked_chain_collection.children.link(hooks_collection)
 
@@ -59,6 +64,7 @@ def make_hooked_chain(
         hook = bpy.data.objects.new(f'hook_{i}_empty'+subobj_suffix, None)
         
         hook.location = vertices[i].copy()
+        stamp_hook(hook, hooked_chain_collection.name, i)
         
         #bpy.context.scene.collection.objects.link(hook)
         hooks_collection.objects.link(hook)  # Link to hooks collection instead of scene collection
@@ -90,18 +96,21 @@ def make_hooked_chain(
         bpy.ops.object.mode_set(mode='OBJECT')
 
         hook_empties.append(hook)
-    
+        hook_mod_names.append(hook_mod.name)
+
+    stamp_hook_modifiers(obj, hook_mod_names)
     return obj, hook_empties
 
 
-def change_hook_strength(hooked_objs, new_strength=1.0):
-    # For all objects in scene
+def change_hook_strength(hooked_objs, new_strength=1.0, hook_idxs=None):
+    """
+    Set the strength (0.0 to 1.0) of the hook modifiers of chain objects,
+    or only of the hooks hook_idxs; the modifiers are looked up by the
+    names make_hooked_chain stamped on the chain.
+    """
     for obj in hooked_objs:
-    # Check modifiers
-        for mod in obj.modifiers:
-            # If modifier is a hook
-            if mod.type == 'HOOK':
-                mod.strength = new_strength # Change this value (0.0 to 1.0)
+        for mod in discover_hook_modifiers(obj, hook_idxs):
+            mod.strength = new_strength
 
 
 
@@ -110,7 +119,19 @@ def add_distance_constraint(
         obj2,
         distance=8,
         limit_mode='LIMITDIST_INSIDE', # or 'LIMITDIST_INSIDE' or 'LIMITDIST_OUTSIDE' or 'LIMITDIST_ONSURFACE'
-        influence=0.5):
+        influence=0.5,
+        tags=None,
+        buffer=None):
+    """
+    Limit the distance of obj1 to obj2. With a CommandBuffer as buffer, the
+    constraint is only recorded, and its name is returned instead.
+    """
+    if buffer is not None:
+        return buffer.add_constraint(
+            obj1.name, 'LIMIT_DISTANCE', target=obj2.name,
+            tags=tags or {'role': 'distance'},
+            distance=distance, limit_mode=limit_mode,
+            use_transform_limit=True, influence=influence)
 
     # Create distance constraint
     constraint = obj1.constraints.new(type='LIMIT_DISTANCE')
@@ -119,6 +140,9 @@ def add_distance_constraint(
     constraint.limit_mode = limit_mode
     constraint.use_transform_limit = True
     constraint.influence = influence
+
+    # register in the constraint index, see polender.constraints
+    register_constraint(obj1, constraint, **(tags or {'role': 'distance'}))
     
     return constraint
 
@@ -128,7 +152,13 @@ def change_constraints(
         objs, 
         constraint_type='LIMIT_DISTANCE', 
         cond_f=None,
+        verbose=False,
+        tags=None,
         **kwargs):
+    # Registered polender constraints can be changed by tags in O(matches)
+    if tags is not None:
+        return set_constraints(tags, verbose=verbose, **kwargs)
+
     # For all objects in scene
     for obj in objs:
     # Check modifiers
@@ -138,7 +168,8 @@ def change_constraints(
                 and    
                 (cond_f is None or cond_f(constraint))
                  ):
-                print(f'object {obj}, modifier {constraint} changed: {kwargs}')
+                if verbose:
+                    print(f'object {obj}, modifier {constraint} changed: {kwargs}')
                 for k,v in kwargs.items():
                     setattr(constraint, k, v)
 
@@ -147,7 +178,13 @@ def change_constraints(
 def disable_constraints(
         objs, 
         cond_f=None,
-        mode='disable'):
+        mode='disable',
+        verbose=False,
+        tags=None):
+    # Registered polender constraints can be toggled by tags in O(matches)
+    if tags is not None:
+        return toggle_constraints(tags, enable=False, mode=mode, verbose=verbose)
+
     # For all objects in scene
     for obj in objs:
     # Check modifiers
@@ -155,17 +192,25 @@ def disable_constraints(
             # If modifier is a hook
             if (cond_f is None or cond_f(constraint)):
                 if mode == 'disable':
-                    print(f'disabling object {obj}, modifier {constraint}')
+                    if verbose:
+                        print(f'disabling object {obj}, modifier {constraint}')
                     constraint.enabled = False
                 elif mode == 'mute':
-                    print(f'muting object {obj}, modifier {constraint}')
+                    if verbose:
+                        print(f'muting object {obj}, modifier {constraint}')
                     constraint.mute = True
 
 
 def enable_constraints(
         objs, 
         cond_f=None,
-        mode='disable'):
+        mode='disable',
+        verbose=False,
+        tags=None):
+    # Registered polender constraints can be toggled by tags in O(matches)
+    if tags is not None:
+        return toggle_constraints(tags, enable=True, mode=mode, verbose=verbose)
+
     # For all objects in scene
     for obj in objs:
     # Check modifiers
@@ -173,10 +218,12 @@ def enable_constraints(
             # If modifier is a hook
             if (cond_f is None or cond_f(constraint)):
                 if mode == 'disable':
-                    print(f'disabling object {obj}, modifier {constraint}')
+                    if verbose:
+                        print(f'disabling object {obj}, modifier {constraint}')
                     constraint.enabled = True
                 elif mode == 'mute':
-                    print(f'muting object {obj}, modifier {constraint}')
+                    if verbose:
+                        print(f'muting object {obj}, modifier {constraint}')
                     constraint.mute = False
 
 
@@ -184,7 +231,8 @@ def chain_hooks(
         hooks, 
         max_dist=8,
         min_dist=None,
-        influence=0.5):
+        influence=0.5,
+        buffer=None):
 
     # or 'LIMITDIST_INSIDE' or 'LIMITDIST_OUTSIDE' or 'LIMITDIST_ONSURFACE'
     # Add constraints between consecutive pairs
@@ -195,7 +243,9 @@ def chain_hooks(
             hooks[i+1],
             distance=max_dist, 
             limit_mode='LIMITDIST_ONSURFACE' if max_dist == min_dist else 'LIMITDIST_INSIDE', 
-            influence=influence)
+            influence=influence,
+            tags={'role': 'chain_bond', 'bond': (i, i+1), 'limit': 'max'},
+            buffer=buffer)
         
     if min_dist is not None and min_dist != max_dist:
         for i in range(len(hooks)-1):
@@ -204,7 +254,9 @@ def chain_hooks(
                 hooks[i+1],
                 distance=min_dist, 
                 limit_mode='LIMITDIST_OUTSIDE', 
-                influence=influence)
+                influence=influence,
+                tags={'role': 'chain_bond', 'bond': (i, i+1), 'limit': 'min'},
+                buffer=buffer)
 
 
 def add_fiber_softbody(obj):
@@ -231,10 +283,55 @@ def add_fiber_softbody(obj):
     soft_body.point_cache.frame_end = 1000
 
 
-def set_skin_radius(obj, skin_radius=0.5):
+def _per_vertex_skin_radius(skin_radius, n_verts):
+    # (X, Y) radius for each vertex
+    r = np.asarray(skin_radius, dtype=np.float32)
+    if r.ndim == 0:
+        return np.full((n_verts, 2), r, dtype=np.float32)
+    if r.shape == (n_verts,):
+        return np.repeat(r[:, None], 2, axis=1)
+    if r.shape == (n_verts, 2):
+        return r
+    raise ValueError(
+        f"skin radius must be a scalar or an array of shape ({n_verts},) or ({n_verts}, 2), "
+        f"got {r.shape}")
+
+
+def set_skin_radius(obj, skin_radius=0.5, frames=None):
+    """
+    Set the skin radius of all vertices of a skinned mesh in one call.
+
+    Args:
+        obj: the mesh object with a skin modifier
+        skin_radius: a scalar, an (N,) array of per-vertex radii or an (N, 2)
+            array of per-vertex (X, Y) radii. If frames are given, one such
+            value per frame, i.e. an array of shape (F,), (F, N) or (F, N, 2).
+        frames: if given, the radii are keyframed at these frames, and the
+            radii of the first frame are set as the current ones.
+    """
     skin_data = obj.data.skin_vertices[0].data
-    for skin_vert in skin_data:
-        skin_vert.radius = (skin_radius, skin_radius)  # (X, Y) radius for each vertex
+    n_verts = len(skin_data)
+
+    if frames is None:
+        radius = _per_vertex_skin_radius(skin_radius, n_verts)
+        skin_data.foreach_set('radius', radius.ravel())
+        return
+
+    frames = np.asarray(frames)
+    skin_radius = np.asarray(skin_radius, dtype=np.float32)
+    if len(skin_radius) != len(frames):
+        raise ValueError("skin_radius must have one entry per frame")
+    radius = np.stack([_per_vertex_skin_radius(r, n_verts) for r in skin_radius])
+
+    skin_data.foreach_set('radius', radius[0].ravel())
+
+    path_template = skin_data[0].path_from_id('radius').replace('.data[0].', '.data[{}].')
+    fcurves = fcurve_map(ensure_action(obj.data))
+    for i in range(n_verts):
+        for axis in range(2):
+            set_fcurve_keyframes(
+                obj.data, path_template.format(i), axis, frames, radius[:, i, axis],
+                fcurves=fcurves)
 
 
 
@@ -266,41 +363,20 @@ def _arrange_hooks_into_loop(
         arrange_stem=True,
         arrange_loop=False,
         vertical_orientation=1):
-    
-    l_loop = len(hooks_loop)
-    vo = vertical_orientation
-
-    real_stem_length = min(stem_length, int(round(l_loop / 2)))
-    for i in range(real_stem_length):
-        if i == 0 and not arrange_root:
-            continue
-        if i > 0 and not arrange_stem:
-            continue
-        hook = hooks_loop[i]
-        hook.location = root_loc + Vector((-bridge_width/2, i * step * vo, 0))
-
-        hook = hooks_loop[-i-1]
-        hook.location = root_loc + Vector((bridge_width/2, i * step * vo, 0))
 
-    if arrange_loop and l_loop > 2 * stem_length:
-        
-        n_hooks_circle = l_loop - 2 * stem_length 
-        l_circle = n_hooks_circle * step
-        r_circle = l_circle / math.pi / 2
-
-        stem_angle = np.arcsin(bridge_width / 2 / r_circle)
-        loop_total_angle = 2 * math.pi - stem_angle * 2
-
-        angle_per_hook = loop_total_angle / (n_hooks_circle + 1 )
-
-        center_circle = root_loc + Vector((0, step * (stem_length - 1) * vo, 0)) + Vector((0, r_circle * vo, 0))
+    positions, mask = loop_layout(
+        len(hooks_loop),
+        step,
+        root_loc,
+        bridge_width,
+        stem_length=stem_length,
+        arrange_root=arrange_root,
+        arrange_stem=arrange_stem,
+        arrange_loop=arrange_loop,
+        vertical_orientation=vertical_orientation)
 
-        for i, hook in enumerate(hooks_loop[stem_length:-stem_length]):
-            hook_angle = 1.5 * math.pi - angle_per_hook * (i + 1) - stem_angle
-            hook_position = center_circle.copy()
-            hook_position[0] += r_circle * math.cos(hook_angle)
-            hook_position[1] += (r_circle * math.sin(hook_angle)) * vo
-            hook.location = hook_position.copy()
+    for idx in np.flatnonzero(mask).tolist():
+        hooks_loop[idx].location = positions[idx].tolist()
             
 
 def keyframe_hook_loop(
@@ -312,21 +388,14 @@ def keyframe_hook_loop(
     stem_length=2,
     no_keyframe_elements=[], 
     vertical_orientation=1,
+    buffer=None,
     ):
-
-    bpy.context.scene.frame_set(int(t))
-
-    _arrange_hooks_into_loop(
-        hooks_loop,
-        step,
-        root_loc,
-        bridge_width,
-        stem_length,
-        arrange_root=True,
-        arrange_stem=True,
-        arrange_loop=True,
-        vertical_orientation=vertical_orientation)
-    
+    """
+    Key the hooks of a loop at time t, arranged into the loop's layout.
+    With a CommandBuffer as buffer, the keys are recorded instead; the
+    buffer is only flushed if some keyed hook is not arranged, as its
+    location is then read from the animation at t.
+    """
     N = len(hooks_loop)
     hook_idxs_to_skip = set()
 
@@ -346,42 +415,63 @@ def keyframe_hook_loop(
     if 'loop' in no_keyframe_elements:
         hook_idxs_to_skip.update(set(range(stem_length, N-stem_length)))
     
-    hooks_to_keyframe = [hook for i, hook in enumerate(hooks_loop) if i not in hook_idxs_to_skip]
-
-    for hook in hooks_to_keyframe:    
-        hook.keyframe_insert(data_path="location", frame=int(t))
-
-
-def _schedule_extrusion(
-        final_loop_len,
-        init_loop_idxs,
-        time_span,
-):
-    
-    if init_loop_idxs is None:
-        init_loop_idxs = (final_loop_len // 2, final_loop_len // 2 + 1)
+    if buffer is not None:
+        positions, mask = loop_layout(
+            N,
+            step,
+            root_loc,
+            bridge_width,
+            stem_length=stem_length,
+            arrange_root=True,
+            arrange_stem=True,
+            arrange_loop=True,
+            vertical_orientation=vertical_orientation)
+        keyed = [i for i in range(N) if i not in hook_idxs_to_skip]
+        if not keyed:
+            return
+        if not mask[keyed].all():
+            buffer.flush()
+            bpy.context.scene.frame_set(int(t))
+            for i in keyed:
+                if not mask[i]:
+                    positions[i] = hooks_loop[i].location
+        buffer.keyframe_objects(
+            [hooks_loop[i].name for i in keyed], 'location', [int(t)], positions[keyed][None])
+        return
 
-    n_steps = max(init_loop_idxs[0], final_loop_len - init_loop_idxs[1]) + 1
+    bpy.context.scene.frame_set(int(t))
 
-    ts = np.linspace(time_span[0], time_span[1], n_steps, dtype=int)
+    _arrange_hooks_into_loop(
+        hooks_loop,
+        step,
+        root_loc,
+        bridge_width,
+        stem_length,
+        arrange_root=True,
+        arrange_stem=True,
+        arrange_loop=True,
+        vertical_orientation=vertical_orientation)
 
-    loop_traj = {}
+    hooks_to_keyframe = [hook for i, hook in enumerate(hooks_loop) if i not in hook_idxs_to_skip]
 
-    for i in range(n_steps):
-        loop_traj[ts[i]] =  (
-                max(0, init_loop_idxs[0] - i),
-                min(final_loop_len, init_loop_idxs[1] + i))
-        
-    return loop_traj
+    for hook in hooks_to_keyframe:    
+        hook.keyframe_insert(data_path="location", frame=int(t))
 
 
 def animate_le_constraints(
         hooks,
         loop_traj,
         bridge_width = 2.5,
-        influence=0.5
+        influence=0.5,
+        loop_id=None,
+        buffer=None,
 ):
-    
+    """
+    Add a distance constraint for every loop of loop_traj, with its influence
+    keyed up at the loop's time and down at the neighbouring times. With a
+    CommandBuffer as buffer, constraints and keys are recorded instead, which
+    saves the three frame_set() calls per loop.
+    """
     ts = np.array(list(loop_traj.keys()))
 
     for i in range(1, len(ts)):
@@ -395,9 +485,18 @@ def animate_le_constraints(
             hooks[cur_loop[0]],
             hooks[cur_loop[1]-1],
             distance=bridge_width,
-            influence=influence
+            influence=influence,
+            tags={'role': 'loop', 'loop_id': -1 if loop_id is None else loop_id, 't': int(t)},
+            buffer=buffer,
         )
 
+        if buffer is not None:
+            frames = [f for f in (prev_t, t, next_t) if f is not None]
+            buffer.keyframe_constraint(
+                hooks[cur_loop[0]].name, constraint, 'influence', frames,
+                [influence if f == t else 0.0 for f in frames])
+            continue
+
         bpy.context.scene.frame_set(t)
         constraint.keyframe_insert(data_path="influence", frame=t)
         
@@ -423,12 +522,14 @@ def _animate_extrusion_no_tails(
         animate_stem=True, # unused
         n_intermediate_keyframes = 0,
         vertical_orientation=1,
-        add_constraints_with_influence=None
+        add_constraints_with_influence=None,
+        loop_id=None,
+        buffer=None,
 ):
 
     bpy.context.scene.frame_set(int(time_span[0]))
 
-    loop_traj = _schedule_extrusion(
+    loop_traj = schedule_extrusion(
         len(hooks),
         init_loop_idxs,
         time_span,
@@ -439,7 +540,9 @@ def _animate_extrusion_no_tails(
             hooks,
             loop_traj,
             bridge_width = bridge_width,
-            influence=add_constraints_with_influence
+            influence=add_constraints_with_influence,
+            loop_id=loop_id,
+            buffer=buffer,
         )
     
     if root_loc is None:
@@ -454,6 +557,11 @@ def _animate_extrusion_no_tails(
     for i, (t, loop_span) in enumerate(loop_traj.items()):
         if i == 0:
             bpy.context.scene.frame_set(int(t))
+            if buffer is not None:
+                buffer.keyframe_objects(
+                    [hook.name for hook in hooks], 'location', [int(t)],
+                    np.array([hook.location for hook in hooks])[None])
+                continue
             for hook in hooks:
                 hook.keyframe_insert(data_path="location", frame=int(t))
         else:
@@ -476,21 +584,13 @@ def _animate_extrusion_no_tails(
                 bridge_width,
                 stem_length=stem_length, 
                 no_keyframe_elements=no_keyframe_elements,
-                vertical_orientation=vertical_orientation
+                vertical_orientation=vertical_orientation,
+                buffer=buffer,
                 )
 
 
 def normalize_loop_traj(loop_traj):
-    if not isinstance(loop_traj, dict):
-        raise ValueError("loop_traj must be a dictionary {time: (start_loop, end_loop)}")
-    loop_traj = dict(sorted(loop_traj.items(), key=lambda x: x[0]))
-
-    # infer loading position assuming two-sided extrusion
-    if list(loop_traj.values())[0] is None:
-        next_loop = list(loop_traj.values())[1]
-        mid_next_loop = (next_loop[0] + next_loop[1]) // 2
-        loop_traj[list(loop_traj.keys())[0]] = (mid_next_loop, mid_next_loop + 1)
-    return loop_traj
+    return LoopTrajectory.from_dict(loop_traj).to_dict(0)
 
 
 def animate_looparray_extrusion(
@@ -503,98 +603,122 @@ def animate_looparray_extrusion(
     add_constraints_with_influence=None,
     shift_backbone=True,
     ):
-
-    if isinstance(loops_traj, dict):
-        loops_traj = [loops_traj]
-
-    loops_traj = [normalize_loop_traj(lt) for lt in loops_traj]
-
+    """
+    Animate the extrusion of an array of loops.
+
+    Args:
+        hooks: list of hook empties of the chain
+        loops_traj: a {time: (start_loop, end_loop)} dict, a list of such dicts
+            (one per loop extruder) or a LoopTrajectory
+        vertical_orientations: orientation (1 or -1) of every loop extruder;
+            ignored for a LoopTrajectory, which carries its own orientations
+    """
+
+    if isinstance(loops_traj, LoopTrajectory):
+        loops_traj_arr = loops_traj
+    else:
+        loops_traj_arr = LoopTrajectory.from_dicts(
+            loops_traj, orientations=vertical_orientations)
+
+    transitions = loops_traj_arr.transitions()
+
+    # the hook keys and constraints of a transition are recorded and written
+    # in bulk, one keyframe_points.add() and foreach_set() per fcurve; the
+    # buffer is flushed after every transition, as the next one and the
+    # backbone shifts read the animated locations
+    buffer = CommandBuffer()
     linear_shifts = []
-    if vertical_orientations is None:
-        vertical_orientations = [1] * len(loops_traj)
-
-    for loop_traj, vo in zip(loops_traj, vertical_orientations):
-        last_t = max(loop_traj.keys())
-        final_loop = loop_traj[last_t]
-
-        for (t_lo, prev_loop), (t_hi, next_loop) in zip(
-                list(loop_traj.items())[:-1],
-                list(loop_traj.items())[1:]):
-
-            rel_init_loop_idxs = (prev_loop[0] - next_loop[0], prev_loop[1] - next_loop[0])
-
-            _animate_extrusion_no_tails(
-                hooks[slice(*next_loop)],
-                time_span = (t_lo, t_hi),
-                step=step,
-                bridge_width=bridge_width,
-                stem_length=2,
-                root_loc = None,
-                init_loop_idxs = rel_init_loop_idxs,
-                n_intermediate_keyframes=n_intermediate_keyframes,
-                vertical_orientation=vo,
-                add_constraints_with_influence=add_constraints_with_influence
-                )
-            
 
-            delta_left = (
-                get_obj_loc(hooks[next_loop[0]], t_hi) 
-                - get_obj_loc(hooks[next_loop[0]], t_lo) )
-            
-            delta_right = (
-                get_obj_loc(hooks[next_loop[1]-1], t_hi) 
-                - get_obj_loc(hooks[next_loop[1]-1], t_lo) )
+    for (lef_id, t_lo, t_hi, prev_left, prev_right, next_left, next_right, 
+         final_left, final_right, vo) in zip(
+            transitions['lef_id'].tolist(),
+            transitions['t_lo'].tolist(),
+            transitions['t_hi'].tolist(),
+            transitions['prev_left'].tolist(),
+            transitions['prev_right'].tolist(),
+            transitions['next_left'].tolist(),
+            transitions['next_right'].tolist(),
+            transitions['final_left'].tolist(),
+            transitions['final_right'].tolist(),
+            transitions['orientation'].tolist()):
+
+        rel_init_loop_idxs = (prev_left - next_left, prev_right - next_left)
+
+        _animate_extrusion_no_tails(
+            hooks[next_left:next_right],
+            time_span = (t_lo, t_hi),
+            step=step,
+            bridge_width=bridge_width,
+            stem_length=2,
+            root_loc = None,
+            init_loop_idxs = rel_init_loop_idxs,
+            n_intermediate_keyframes=n_intermediate_keyframes,
+            vertical_orientation=vo,
+            add_constraints_with_influence=add_constraints_with_influence,
+            loop_id=lef_id,
+            buffer=buffer,
+            )
+        buffer.flush()
+        
 
-            # delta_left = (prev_loop[0] - next_loop[0]) * Vector((step, 0, 0))
-            # delta_right = (prev_loop[1] - next_loop[1]) * Vector((step, 0, 0))
+        delta_left = (
+            get_obj_loc(hooks[next_left], t_hi) 
+            - get_obj_loc(hooks[next_left], t_lo) )
+        
+        delta_right = (
+            get_obj_loc(hooks[next_right-1], t_hi) 
+            - get_obj_loc(hooks[next_right-1], t_lo) )
 
-            if not shift_backbone:
-                continue
+        # delta_left = (prev_loop[0] - next_loop[0]) * Vector((step, 0, 0))
+        # delta_right = (prev_loop[1] - next_loop[1]) * Vector((step, 0, 0))
 
-            linear_shifts.append(
-                functools.partial(
-                    animate_linear_shift,
-                    hooks[0:final_loop[0]], 
-                    shift_vector=delta_left,
-                    time_span=(t_lo, t_hi),
-                    shift_existing_keyframes=True,
-                    extend=True
-                )
-            )
+        if not shift_backbone:
+            continue
 
-            linear_shifts.append(
-                functools.partial(
-                    animate_linear_shift,
-                    hooks[final_loop[0]:next_loop[0]], 
-                    shift_vector=delta_left,
-                    time_span=(t_lo, t_hi),
-                    shift_existing_keyframes=True,
-                    extend=False
-                    )
+        linear_shifts.append(
+            functools.partial(
+                animate_linear_shift,
+                hooks[0:final_left], 
+                shift_vector=delta_left,
+                time_span=(t_lo, t_hi),
+                shift_existing_keyframes=True,
+                extend=True
             )
+        )
 
-            linear_shifts.append(
-                functools.partial(
-                    animate_linear_shift,
-                    hooks[next_loop[1]:final_loop[1]], 
-                    shift_vector=delta_right,
-                    time_span=(t_lo, t_hi),
-                    shift_existing_keyframes=True,
-                    extend=False
-                    )
-            )
+        linear_shifts.append(
+            functools.partial(
+                animate_linear_shift,
+                hooks[final_left:next_left], 
+                shift_vector=delta_left,
+                time_span=(t_lo, t_hi),
+                shift_existing_keyframes=True,
+                extend=False
+                )
+        )
 
-        
-            linear_shifts.append(
-                functools.partial(
-                    animate_linear_shift,
-                    hooks[final_loop[1]:], 
-                    shift_vector=delta_right,
-                    time_span=(t_lo, t_hi),
-                    shift_existing_keyframes=True,
-                    extend=True
+        linear_shifts.append(
+            functools.partial(
+                animate_linear_shift,
+                hooks[next_right:final_right], 
+                shift_vector=delta_right,
+                time_span=(t_lo, t_hi),
+                shift_existing_keyframes=True,
+                extend=False
                 )
+        )
+
+    
+        linear_shifts.append(
+            functools.partial(
+                animate_linear_shift,
+                hooks[final_right:], 
+                shift_vector=delta_right,
+                time_span=(t_lo, t_hi),
+                shift_existing_keyframes=True,
+                extend=True
             )
+        )
             
 
     if shift_backbone:
@@ -0,0 +1,313 @@
+import os
+import json
+import glob
+import time
+import hashlib
+import inspect
+import functools
+
+import numpy as np
+
+import bpy
+
+from .constraints import get_constraint_index
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'POLENDER_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'polender', 'scenes'))
+
+
+def _code_names(code):
+    # global names read by a function, including its nested functions and lambdas
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _function_inputs(fn):
+    """Values of the globals and closure variables a function reads, by name."""
+    fn = getattr(fn, '__func__', fn)
+    fn_globals = getattr(fn, '__globals__', {})
+    inputs = {}
+    for name in sorted(_code_names(fn.__code__)):
+        if name not in fn_globals:
+            continue
+        value = fn_globals[name]
+        # modules and classes are code, covered by the polender fingerprint
+        # or the environment, not build parameters
+        if inspect.ismodule(value) or inspect.isclass(value) or inspect.isbuiltin(value):
+            continue
+        inputs[name] = value
+    for name, cell in zip(fn.__code__.co_freevars, fn.__closure__ or ()):
+        try:
+            inputs[f'<closure>{name}'] = cell.cell_contents
+        except ValueError:
+            pass
+    return inputs
+
+
+def _update_hash(h, obj, _seen=None):
+    _seen = set() if _seen is None else _seen
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        h.update(f'{type(obj).__name__}:{obj!r};'.encode())
+    elif isinstance(obj, (np.ndarray, np.generic)):
+        arr = np.ascontiguousarray(obj)
+        h.update(f'ndarray:{arr.dtype.str}:{arr.shape};'.encode())
+        h.update(arr.tobytes())
+    elif isinstance(obj, dict):
+        h.update(f'dict:{len(obj)};'.encode())
+        for k in sorted(obj, key=repr):
+            _update_hash(h, k, _seen)
+            _update_hash(h, obj[k], _seen)
+    elif isinstance(obj, (set, frozenset)):
+        h.update(f'set:{len(obj)};'.encode())
+        for v in sorted(obj, key=repr):
+            _update_hash(h, v, _seen)
+    elif isinstance(obj, (list, tuple, range)):
+        h.update(f'{type(obj).__name__}:{len(obj)};'.encode())
+        for v in obj:
+            _update_hash(h, v, _seen)
+    elif inspect.isfunction(obj) or inspect.ismethod(obj):
+        # the build code itself is an input, and so are the module-level
+        # parameters and closure variables it reads
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = obj.__code__.co_code.hex()
+        h.update(f'function:{obj.__qualname__}:{source};'.encode())
+        fn = getattr(obj, '__func__', obj)
+        if id(fn) in _seen:
+            return
+        _seen.add(id(fn))
+        _update_hash(h, _function_inputs(fn), _seen)
+    elif hasattr(obj, '__dict__'):
+        # e.g. LoopTrajectory: hash the class and its attributes
+        h.update(f'object:{type(obj).__qualname__};'.encode())
+        _update_hash(h, vars(obj), _seen)
+    elif hasattr(obj, '__iter__'):
+        # e.g. mathutils.Vector
+        _update_hash(h, tuple(obj), _seen)
+    else:
+        h.update(f'repr:{obj!r};'.encode())
+
+
+@functools.lru_cache(maxsize=None)
+def polender_fingerprint():
+    """Hash of the source of the polender package, standing in for its version."""
+    h = hashlib.sha256()
+    pkg_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(pkg_dir, '*.py'))):
+        h.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def hash_inputs(*args, **kwargs):
+    """
+    Content hash of build inputs: NumPy arrays, LoopTrajectory, dicts,
+    sequences, scalars, and functions (by source, and by the values of the
+    globals and closure variables they read); includes the polender
+    fingerprint, so that changing polender invalidates cached scenes.
+    """
+    h = hashlib.sha256()
+    h.update(polender_fingerprint().encode())
+    _update_hash(h, args)
+    _update_hash(h, kwargs)
+    return h.hexdigest()
+
+
+class SceneBuildCache:
+    """
+    Content-addressed cache of built scenes.
+
+    A scene is stored as <cache_dir>/<key>.blend, where the key is a hash of
+    the build inputs. On a hit, the scene is either opened (mode='open') or
+    its collections are appended to the current file (mode='append'), so
+    that camera, lighting or materials can be iterated on without paying for
+    the build again.
+
+    Example:
+        cache = SceneBuildCache()
+        key = cache.key(N_NODES, STEP, loops_traj, build_chains)
+        cache.build(key, build_chains, collections=['hooked_chain_1', 'hooked_chain_2'])
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = os.path.abspath(bpy.path.abspath(cache_dir or DEFAULT_CACHE_DIR))
+
+    def key(self, *args, **kwargs):
+        return hash_inputs(*args, **kwargs)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.blend')
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def keys(self):
+        return sorted(os.path.basename(p)[:-len('.blend')]
+                      for p in glob.glob(os.path.join(self.cache_dir, '*.blend')))
+
+    def save(self, key, collections=None, meta=None):
+        """
+        Save the current scene under key: the whole file, or only the given
+        collections (names or collections) with their dependencies.
+        For the whole file, the objects linked directly to the scene (e.g.
+        cameras and lights), the world and the frame range are recorded,
+        so that mode='append' restores them too.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        scene = bpy.context.scene
+        scene_meta = None
+        if collections is None:
+            scene_meta = {
+                'objects': [obj.name for obj in scene.collection.objects],
+                'world': scene.world.name if scene.world is not None else None,
+                'camera': scene.camera.name if scene.camera is not None else None,
+                'frame_start': scene.frame_start,
+                'frame_end': scene.frame_end,
+                'frame_step': scene.frame_step,
+                'fps': scene.render.fps,
+            }
+        path = self.path(key)
+        tmp_path = path + '.tmp.blend'
+        if collections is None:
+            bpy.ops.wm.save_as_mainfile(filepath=tmp_path, copy=True)
+        else:
+            collections = [bpy.data.collections[c] if isinstance(c, str) else c
+                           for c in collections]
+            bpy.data.libraries.write(tmp_path, set(collections), fake_user=True)
+        # write atomically, so that an interrupted save never leaves a bad hit
+        os.replace(tmp_path, path)
+
+        with open(self._meta_path(key), 'w') as f:
+            json.dump({
+                'key': key,
+                'created': time.time(),
+                'collections': (None if collections is None
+                                else [c.name for c in collections]),
+                'scene': scene_meta,
+                'polender': polender_fingerprint(),
+                **(meta or {}),
+            }, f, indent=2)
+        return path
+
+    def meta(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self, key, mode='append', collections=None):
+        """
+        Load a cached scene: mode='open' replaces the current file,
+        mode='append' appends its collections (all stored ones by default)
+        and links them to the current scene. For a whole-file entry, append
+        also brings the objects linked directly to the scene, the world, the
+        active camera and the frame range; other scene settings (render
+        settings, view layers) are only restored by mode='open'.
+
+        Returns:
+            the appended collections, or None for mode='open'
+        """
+        path = self.path(key)
+        if mode == 'open':
+            bpy.ops.wm.open_mainfile(filepath=path)
+            get_constraint_index().rebuild()
+            return None
+        elif mode != 'append':
+            raise ValueError("mode must be 'append' or 'open'")
+
+        meta = self.meta(key)
+        scene_meta = None
+        if collections is None:
+            collections = meta.get('collections')
+            scene_meta = meta.get('scene') if collections is None else None
+        with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+            if collections is None:
+                # whole-file entry: its top-level collections
+                data_to.collections = list(data_from.collections)
+            else:
+                data_to.collections = [c for c in data_from.collections if c in collections]
+            if scene_meta is not None:
+                object_names = [o for o in data_from.objects
+                                if o in scene_meta['objects'] or o == scene_meta['camera']]
+                data_to.objects = object_names
+                data_to.worlds = [w for w in data_from.worlds if w == scene_meta['world']]
+
+        scene = bpy.context.scene
+        scene_collection = scene.collection
+        children = set()
+        for c in data_to.collections:
+            children.update(child.name for child in c.children)
+        for c in data_to.collections:
+            c.use_fake_user = False
+            if c.name not in children and c.name not in scene_collection.children:
+                scene_collection.children.link(c)
+        if scene_meta is not None:
+            # appended objects may be renamed on a name clash
+            for name, obj in zip(object_names, data_to.objects):
+                if obj is None:
+                    continue
+                if name in scene_meta['objects'] and obj.name not in scene_collection.objects:
+                    scene_collection.objects.link(obj)
+                if name == scene_meta['camera']:
+                    scene.camera = obj
+            if data_to.worlds:
+                scene.world = data_to.worlds[0]
+            scene.frame_start = scene_meta['frame_start']
+            scene.frame_end = scene_meta['frame_end']
+            scene.frame_step = scene_meta['frame_step']
+            scene.render.fps = scene_meta['fps']
+        # the appended objects carry their constraint tags
+        get_constraint_index().rebuild()
+        return list(data_to.collections)
+
+    def build(self, key, build_fn, collections=None, mode='append', rebuild=False, verbose=True):
+        """
+        Load the scene cached under key, or call build_fn() and cache its result.
+
+        Args:
+            key: from `key()`, hashing everything the build depends on
+            build_fn: function building the scene
+            collections: names of the collections to cache and append;
+                None caches the whole file (use mode='open' to load it)
+            mode: 'append' or 'open', see `load`
+            rebuild: ignore and overwrite a cached scene
+
+        Returns:
+            True on a cache hit, False if the scene was built
+        """
+        if not rebuild and key in self:
+            t0 = time.perf_counter()
+            self.load(key, mode=mode, collections=collections)
+            if verbose:
+                print(f'scene {key[:12]} loaded from cache in {time.perf_counter() - t0:.1f}s')
+            return True
+
+        t0 = time.perf_counter()
+        build_fn()
+        build_time = time.perf_counter() - t0
+        self.save(key, collections=collections, meta={'build_time': build_time})
+        if verbose:
+            print(f'scene {key[:12]} built in {build_time:.1f}s and cached')
+        return False
+
+    def invalidate(self, key=None):
+        """Remove one cached scene, or all of them. Returns the number removed."""
+        keys = self.keys() if key is None else [key]
+        n = 0
+        for k in keys:
+            for path in (self.path(k), self._meta_path(k)):
+                if os.path.exists(path):
+                    os.remove(path)
+                    n += path.endswith('.blend')
+        return n
@@ -0,0 +1,335 @@
+import re
+import collections
+
+import numpy as np
+
+
+_CONSTRAINT_PATH_RE = re.compile(r'constraints\["([^"]+)"\]')
+
+
+class CommandBuffer:
+    """
+    Records scene edits (object creation, transforms, keyframes, constraints)
+    into NumPy arrays and flushes them in grouped bulk writes: objects are
+    created and linked collection by collection, and every fcurve is written
+    with one keyframe_points.add() and one foreach_set(), however many times
+    it was keyed.
+
+    Objects are referred to by name, both those created by the buffer and
+    existing ones. The same buffer can be flushed into Blender (BpyBackend,
+    the default) or replayed into a pure-Python SceneStandIn, e.g. to test a
+    scene build without Blender.
+
+    Example:
+        with CommandBuffer() as buf:
+            names = buf.add_objects([f'hook_{i}' for i in range(n)], locations=d[0],
+                                    collection='hooks')
+            buf.keyframe_objects(names, 'location', frames, d)
+        objs = buf.created
+    """
+
+    def __init__(self):
+        self.clear()
+        self.created = {}
+
+    def clear(self):
+        self._objects = []
+        # data_path -> name -> value; later writes win
+        self._props = collections.defaultdict(dict)
+        # (name, data_path, index) -> lists of frame and value chunks
+        self._keys = collections.defaultdict(lambda: ([], []))
+        self._key_interpolation = {}
+        self._constraints = []
+        # owner -> number of recorded constraints, for default names
+        self._n_constraints = collections.Counter()
+
+    def __len__(self):
+        return (len(self._objects) + sum(len(v) for v in self._props.values())
+                + len(self._keys) + len(self._constraints))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.flush()
+
+    def add_object(self, name, collection=None, location=None, rotation=None, scale=None,
+                   **props):
+        """Record the creation of an empty; props are set on the object, e.g. empty_display_size."""
+        self._objects.append({'name': name, 'collection': collection, 'props': props})
+        for data_path, value in (('location', location), ('rotation_euler', rotation),
+                                 ('scale', scale)):
+            if value is not None:
+                self._props[data_path][name] = np.asarray(value, dtype=np.float64)
+        return name
+
+    def add_objects(self, names, collection=None, locations=None, **props):
+        """Record the creation of many empties, with (N, 3) locations."""
+        names = list(names)
+        locations = (None if locations is None
+                     else np.asarray(locations, dtype=np.float64).reshape(len(names), 3))
+        for i, name in enumerate(names):
+            self.add_object(name, collection=collection,
+                            location=None if locations is None else locations[i], **props)
+        return names
+
+    def set_property(self, names, data_path, values):
+        """Record setting a property of one or many objects, e.g. 'location' with (N, 3) values."""
+        if isinstance(names, str):
+            names, values = [names], [values]
+        for name, value in zip(names, values):
+            self._props[data_path][name] = np.asarray(value)
+
+    def set_locations(self, names, locations):
+        self.set_property(names, 'location', np.asarray(locations, dtype=np.float64))
+
+    def keyframe(self, name, data_path, frames, values, index=None, interpolation=None):
+        """
+        Record keyframes of one property of one object.
+
+        Args:
+            frames: (K,) frames
+            values: (K,) values of property component `index`, or (K, D)
+                values of all D components of a vector property
+        """
+        frames = np.atleast_1d(np.asarray(frames, dtype=np.float64))
+        values = np.asarray(values, dtype=np.float64).reshape(len(frames), -1)
+        if index is not None and values.shape[1] != 1:
+            raise ValueError(
+                f"values of component {index} of {data_path} must have shape (K,), "
+                f"got {values.shape[1]} components; pass index=None to key all of them")
+        indices = [index] if index is not None else range(values.shape[1])
+        for column, idx in enumerate(indices):
+            key = (name, data_path, idx)
+            frames_acc, values_acc = self._keys[key]
+            frames_acc.append(frames)
+            values_acc.append(values[:, column])
+            if interpolation is not None:
+                self._key_interpolation[key] = interpolation
+
+    def keyframe_objects(self, names, data_path, frames, values, interpolation=None):
+        """Record keyframes of many objects: (F,) frames and (F, N, D) values."""
+        frames = np.atleast_1d(np.asarray(frames, dtype=np.float64))
+        values = np.asarray(values, dtype=np.float64)
+        values = values.reshape(len(frames), len(names), -1)
+        for i, name in enumerate(names):
+            self.keyframe(name, data_path, frames, values[:, i], interpolation=interpolation)
+
+    def add_constraint(self, owner, type, name=None, target=None, tags=None, **props):
+        """
+        Record a constraint on an object, e.g.
+        add_constraint('hook_1', 'LIMIT_DISTANCE', target='hook_9', distance=2.5).
+        Tags register the constraint in polender's constraint index.
+
+        Returns:
+            the name of the constraint
+        """
+        if name is None:
+            name = f'{type.lower()}_{self._n_constraints[owner]}'
+        self._n_constraints[owner] += 1
+        self._constraints.append({
+            'owner': owner, 'type': type, 'name': name,
+            'target': target, 'tags': tags, 'props': props})
+        return name
+
+    def keyframe_constraint(self, owner, constraint_name, prop, frames, values,
+                            interpolation=None):
+        """Record keyframes of a constraint property, e.g. its influence."""
+        self.keyframe(owner, f'constraints["{constraint_name}"].{prop}', frames, values,
+                      index=0, interpolation=interpolation)
+
+    def _merged_keys(self):
+        for key, (frames_acc, values_acc) in self._keys.items():
+            frames = np.concatenate(frames_acc)
+            values = np.concatenate(values_acc)
+            # the last value recorded at a frame wins
+            _, last = np.unique(frames[::-1], return_index=True)
+            keep = np.sort(len(frames) - 1 - last)
+            yield key, frames[keep], values[keep]
+
+    def flush(self, backend=None):
+        """
+        Apply the recorded edits in bulk and clear the buffer.
+
+        Args:
+            backend: BpyBackend (default) or SceneStandIn
+
+        Returns:
+            dict name -> object of the created objects
+        """
+        backend = BpyBackend() if backend is None else backend
+
+        by_collection = collections.defaultdict(list)
+        for record in self._objects:
+            by_collection[record['collection']].append(record)
+        created = {}
+        for collection, records in by_collection.items():
+            created.update(backend.create_objects(records, collection))
+
+        for data_path, values in self._props.items():
+            backend.set_property(list(values), data_path, list(values.values()))
+
+        for record in self._constraints:
+            backend.add_constraint(record)
+
+        for (name, data_path, index), frames, values in self._merged_keys():
+            backend.write_fcurve(
+                name, data_path, index, frames, values,
+                interpolation=self._key_interpolation.get((name, data_path, index)))
+
+        self.created.update(created)
+        self.clear()
+        return created
+
+
+class BpyBackend:
+    """
+    Applies a CommandBuffer to the current Blender file. Properties of the
+    objects created into a collection of their own are written with one
+    foreach_set() over the collection.
+    """
+
+    def __init__(self):
+        import bpy
+        self.bpy = bpy
+        self._objects = {}
+        # collection -> names of the objects it was filled with, in link order
+        self._linked = {}
+        # (owner, recorded name) -> name of the constraint, if Blender renamed it
+        self._constraint_names = {}
+
+    def _get(self, name):
+        obj = self._objects.get(name)
+        return obj if obj is not None else self.bpy.data.objects[name]
+
+    def _collection(self, name):
+        bpy = self.bpy
+        if name is None:
+            return bpy.context.collection
+        if name not in bpy.data.collections:
+            collection = bpy.data.collections.new(name)
+            bpy.context.scene.collection.children.link(collection)
+            return collection
+        return bpy.data.collections[name]
+
+    def create_objects(self, records, collection):
+        collection = self._collection(collection)
+        created = {}
+        for record in records:
+            obj = self.bpy.data.objects.new(record['name'], None)
+            for k, v in record['props'].items():
+                setattr(obj, k, v)
+            collection.objects.link(obj)
+            # Blender may rename on a name clash
+            created[record['name']] = self._objects[record['name']] = obj
+        self._linked.setdefault(collection, []).extend(created)
+        return created
+
+    def set_property(self, names, data_path, values):
+        remaining = dict(zip(names, values))
+        if data_path.isidentifier():
+            for collection, members in self._linked.items():
+                # only valid while the collection holds just these objects
+                if (len(collection.objects) != len(members)
+                        or not all(m in remaining for m in members)):
+                    continue
+                column = [np.asarray(remaining[m]) for m in members]
+                if (len({v.shape for v in column}) != 1
+                        or not all(v.dtype.kind == 'f' for v in column)):
+                    continue
+                collection.objects.foreach_set(
+                    data_path, np.concatenate([v.ravel() for v in column]).astype(np.float32))
+                for m in members:
+                    del remaining[m]
+        for name, value in remaining.items():
+            setattr(self._get(name), data_path, value.tolist() if hasattr(value, 'tolist') else value)
+
+    def add_constraint(self, record):
+        from .constraints import register_constraint
+        obj = self._get(record['owner'])
+        constraint = obj.constraints.new(type=record['type'])
+        constraint.name = record['name']
+        if constraint.name != record['name']:
+            # renamed on a clash with an existing constraint
+            self._constraint_names[(record['owner'], record['name'])] = constraint.name
+        if record['target'] is not None:
+            constraint.target = self._get(record['target'])
+        for k, v in record['props'].items():
+            setattr(constraint, k, v)
+        if record['tags']:
+            register_constraint(obj, constraint, **record['tags'])
+
+    def write_fcurve(self, name, data_path, index, frames, values, interpolation=None):
+        from .dynamics import set_fcurve_keyframes
+        m = _CONSTRAINT_PATH_RE.match(data_path)
+        if m is not None and (name, m.group(1)) in self._constraint_names:
+            data_path = (f'constraints["{self._constraint_names[(name, m.group(1))]}"]'
+                         + data_path[m.end():])
+        set_fcurve_keyframes(self._get(name), data_path, index, frames, values,
+                             interpolation=interpolation)
+
+
+class StandInObject:
+    def __init__(self, name, collection=None):
+        self.name = name
+        self.collection = collection
+        self.location = np.zeros(3)
+        self.rotation_euler = np.zeros(3)
+        self.scale = np.ones(3)
+        self.constraints = {}
+        # (data_path, index) -> (frames, values)
+        self.fcurves = {}
+
+    def __repr__(self):
+        return f'StandInObject({self.name!r})'
+
+    def evaluate(self, data_path, index, frame):
+        """Linearly interpolated value of a keyed property at a frame."""
+        frames, values = self.fcurves[(data_path, index)]
+        return float(np.interp(frame, frames, values))
+
+
+class SceneStandIn:
+    """
+    Pure-Python stand-in of a Blender scene that a CommandBuffer can be
+    replayed into, to inspect or test scene builds without bpy.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.collections = collections.defaultdict(list)
+
+    def create_objects(self, records, collection):
+        created = {}
+        for record in records:
+            obj = StandInObject(record['name'], collection)
+            for k, v in record['props'].items():
+                setattr(obj, k, v)
+            self.objects[obj.name] = created[obj.name] = obj
+            self.collections[collection].append(obj.name)
+        return created
+
+    def _get(self, name):
+        obj = self.objects.get(name)
+        if obj is None:
+            # objects that existed before the build
+            obj = self.objects[name] = StandInObject(name)
+        return obj
+
+    def set_property(self, names, data_path, values):
+        for name, value in zip(names, values):
+            setattr(self._get(name), data_path, np.array(value))
+
+    def add_constraint(self, record):
+        self._get(record['owner']).constraints[record['name']] = dict(record)
+
+    def write_fcurve(self, name, data_path, index, frames, values, interpolation=None):
+        obj = self._get(name)
+        old = obj.fcurves.get((data_path, index))
+        if old is not None:
+            keep = ~np.isin(old[0], frames)
+            frames = np.concatenate([old[0][keep], frames])
+            values = np.concatenate([old[1][keep], values])
+        order = np.argsort(frames, kind='stable')
+        obj.fcurves[(data_path, index)] = (frames[order], values[order])
@@ -0,0 +1,215 @@
+import bpy
+
+
+TAGS_PROP = 'polender_constraint_tags'
+
+
+def _to_hashable(value):
+    if isinstance(value, str):
+        return value
+    if hasattr(value, '__iter__'):
+        return tuple(_to_hashable(v) for v in value)
+    return value
+
+
+def _to_idprop(value):
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+class ConstraintIndex:
+    """
+    Index of the constraints created by polender, keyed by their tags
+    (e.g. role='chain_bond', bond=(12, 13), loop_id=3).
+
+    Entries are stored as (object name, constraint name) pairs. Tags are also
+    stamped on the owner object as a custom property, so that the index can be
+    rebuilt after reloading the module or reopening a .blend file.
+    """
+
+    def __init__(self):
+        self._by_tag = {}
+        self._tags = {}
+        self._built = False
+
+    def __len__(self):
+        return len(self._tags)
+
+    def clear(self):
+        self._by_tag.clear()
+        self._tags.clear()
+        self._built = False
+
+    def add(self, obj, constraint, tags, persist=True):
+        if not _index_handlers_installed:
+            install_index_handlers()
+        entry = (obj.name, constraint.name)
+        tags = {k: _to_hashable(v) for k, v in tags.items()}
+
+        if entry in self._tags:
+            self.remove(entry)
+        self._tags[entry] = tags
+        for item in tags.items():
+            self._by_tag.setdefault(item, set()).add(entry)
+
+        if persist:
+            if TAGS_PROP not in obj.keys():
+                obj[TAGS_PROP] = {}
+            obj[TAGS_PROP][constraint.name] = {
+                k: _to_idprop(v) for k, v in tags.items()}
+
+        return entry
+
+    def remove(self, entry):
+        tags = self._tags.pop(entry, {})
+        for item in tags.items():
+            entries = self._by_tag.get(item)
+            if entries is not None:
+                entries.discard(entry)
+                if not entries:
+                    del self._by_tag[item]
+
+    def rebuild(self, objs=None):
+        """Rebuild the index from the tags stamped on objects."""
+        self.clear()
+        objs = bpy.data.objects if objs is None else objs
+        for obj in objs:
+            if TAGS_PROP not in obj.keys():
+                continue
+            for constraint_name, tags in obj[TAGS_PROP].items():
+                if constraint_name not in obj.constraints:
+                    continue
+                self.add(
+                    obj,
+                    obj.constraints[constraint_name],
+                    tags.to_dict(),
+                    persist=False)
+        self._built = True
+
+    def find(self, **tags):
+        """
+        Return the entries that match all given tags. A list or set as a tag
+        value matches any of its elements.
+        """
+        if not _index_handlers_installed:
+            install_index_handlers()
+        if not self._built and not self._tags:
+            self.rebuild()
+
+        result = None
+        for key, value in tags.items():
+            values = value if isinstance(value, (list, set)) else [value]
+            matches = set()
+            for v in values:
+                matches |= self._by_tag.get((key, _to_hashable(v)), set())
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+
+        if result is None:
+            result = set(self._tags)
+        return sorted(result)
+
+    def resolve(self, entries):
+        """Yield (object, constraint) pairs, dropping stale entries."""
+        for entry in entries:
+            obj_name, constraint_name = entry
+            obj = bpy.data.objects.get(obj_name)
+            constraint = (None if obj is None
+                          else obj.constraints.get(constraint_name))
+            if constraint is None:
+                self.remove(entry)
+                continue
+            yield obj, constraint
+
+
+_INDEX = ConstraintIndex()
+
+
+@bpy.app.handlers.persistent
+def _clear_constraint_index(*args):
+    # entries of the previous file would hide the tags stamped in the new one
+    _INDEX.clear()
+
+
+_index_handlers_installed = False
+
+
+def install_index_handlers():
+    """
+    Clear the constraint index when a file is loaded, so that it is rebuilt
+    from the tags stamped in the new file. Called on the first use of the
+    index.
+    """
+    global _index_handlers_installed
+    # drop handlers left over from a previous import of this module
+    handlers = bpy.app.handlers.load_post
+    for h in list(handlers):
+        if getattr(h, '__name__', None) == _clear_constraint_index.__name__:
+            handlers.remove(h)
+    handlers.append(_clear_constraint_index)
+    _index_handlers_installed = True
+
+
+def get_constraint_index():
+    return _INDEX
+
+
+def register_constraint(obj, constraint, **tags):
+    """Register a constraint in polender's constraint index with given tags."""
+    return _INDEX.add(obj, constraint, tags)
+
+
+def find_constraints(**tags):
+    """Return (object, constraint) pairs of registered constraints matching all tags."""
+    return list(_INDEX.resolve(_INDEX.find(**tags)))
+
+
+def set_constraints(tags, frame=None, verbose=False, buffer=None, **props):
+    """
+    Set properties of all registered constraints that match the tags.
+
+    Args:
+        tags: dict of tags to match, e.g. {'role': 'loop', 'loop_id': 2}
+        frame: if given, the changed properties are keyframed at this frame
+        verbose: print every changed constraint
+        buffer: CommandBuffer recording the keyframes, written in bulk when
+            it is flushed, instead of a keyframe_insert() per property
+        props: properties to set, e.g. influence=0.0
+
+    Returns:
+        the number of changed constraints
+    """
+    n = 0
+    for obj, constraint in _INDEX.resolve(_INDEX.find(**tags)):
+        for k, v in props.items():
+            setattr(constraint, k, v)
+            if frame is None:
+                continue
+            if buffer is not None:
+                # booleans step, as with keyframe_insert
+                buffer.keyframe_constraint(
+                    obj.name, constraint.name, k, [frame], [float(v)],
+                    interpolation='CONSTANT' if isinstance(v, bool) else None)
+            else:
+                constraint.keyframe_insert(data_path=k, frame=frame)
+        if verbose:
+            print(f'object {obj}, constraint {constraint} changed: {props}')
+        n += 1
+    return n
+
+
+def toggle_constraints(tags, enable, mode='disable', frame=None, verbose=False, buffer=None):
+    """
+    Enable or disable (mode='disable') or unmute or mute (mode='mute')
+    all registered constraints that match the tags.
+    """
+    if mode == 'disable':
+        return set_constraints(tags, frame=frame, verbose=verbose, buffer=buffer,
+                               enabled=enable)
+    elif mode == 'mute':
+        return set_constraints(tags, frame=frame, verbose=verbose, buffer=buffer,
+                               mute=not enable)
+    else:
+        raise ValueError("mode must be 'disable' or 'mute'")
@@ -1,5 +1,7 @@
 import warnings
 
+import numpy as np
+
 import bpy
 from mathutils import Vector
 
@@ -48,6 +50,107 @@ def clear_animation(objects=None, properties=None, new_values=None):
                     setattr(obj, prop, value)
 
 
+def ensure_action(id_data, name=None):
+    """Return the action of id_data, creating animation data and an action if needed."""
+    if id_data.animation_data is None:
+        id_data.animation_data_create()
+    if id_data.animation_data.action is None:
+        action = bpy.data.actions.new(name=name or f"{id_data.name}_Action")
+        id_data.animation_data.action = action
+    return id_data.animation_data.action
+
+
+def fcurve_map(action):
+    """Dict (data_path, index) -> fcurve of an action, for many lookups without fcurves.find."""
+    return {(fc.data_path, fc.array_index): fc for fc in action.fcurves}
+
+
+def set_fcurve_keyframes(id_data, data_path, index, frames, values, interpolation=None,
+                         fcurves=None):
+    """
+    Write many keyframes of one fcurve at once, with one keyframe_points.add()
+    and one foreach_set() instead of a keyframe_insert() per key.
+    Existing keys at the same frames are overwritten; the other existing keys
+    keep their interpolation and handle types.
+
+    Args:
+        id_data: the animated ID (object, mesh, curve, ...)
+        data_path: data path of the property, relative to id_data
+        index: array index of the property (0 for scalar properties)
+        frames: (K,) frames
+        values: (K,) values
+        interpolation: if given, set for all keys of the fcurve (e.g. 'LINEAR')
+        fcurves: optional fcurve_map() of the action of id_data, updated with
+            new fcurves; saves a linear fcurves.find per call when writing
+            many fcurves of one ID
+
+    Returns:
+        the fcurve
+    """
+    action = ensure_action(id_data)
+    if fcurves is None:
+        fcurve = action.fcurves.find(data_path, index=index)
+    else:
+        fcurve = fcurves.get((data_path, index))
+    if fcurve is None:
+        fcurve = action.fcurves.new(data_path, index=index)
+        if fcurves is not None:
+            fcurves[(data_path, index)] = fcurve
+
+    frames = np.asarray(frames, dtype=np.float64).ravel()
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if len(frames) != len(values):
+        raise ValueError("the number of frames must match the number of values")
+
+    kps = fcurve.keyframe_points
+    n_old = len(kps)
+    attrs = None
+    if n_old:
+        old_co = np.empty(2 * n_old, dtype=np.float64)
+        kps.foreach_get('co', old_co)
+        old_co = old_co.reshape(-1, 2)
+        old_keep = ~np.isin(old_co[:, 0], frames)
+        old_co = old_co[old_keep]
+
+        # per-key settings move with the keys when they are reordered
+        edit = bpy.context.preferences.edit
+        new_attrs = (edit.keyframe_new_interpolation_type, edit.keyframe_new_handle_type,
+                     edit.keyframe_new_handle_type)
+        attrs = [(kp.interpolation, kp.handle_left_type, kp.handle_right_type)
+                 for kp, keep in zip(kps, old_keep) if keep]
+        attrs += [new_attrs] * len(frames)
+    else:
+        old_co = np.zeros((0, 2))
+
+    co = np.concatenate([old_co, np.stack([frames, values], axis=1)])
+    order = np.argsort(co[:, 0], kind='stable')
+    co = co[order]
+
+    if len(co) > n_old:
+        kps.add(len(co) - n_old)
+    else:
+        for _ in range(n_old - len(co)):
+            kps.remove(kps[len(kps) - 1], fast=True)
+
+    co = co.ravel()
+    kps.foreach_set('co', co)
+    kps.foreach_set('handle_left', co)
+    kps.foreach_set('handle_right', co)
+
+    if attrs is not None:
+        for kp, i in zip(kps, order.tolist()):
+            key_interpolation, left_type, right_type = attrs[i]
+            kp.interpolation = interpolation or key_interpolation
+            kp.handle_left_type = left_type
+            kp.handle_right_type = right_type
+    elif interpolation is not None:
+        for kp in kps:
+            kp.interpolation = interpolation
+
+    fcurve.update()
+    return fcurve
+
+
 def get_obj_loc(obj, frame):
     # Store current frame
     original_frame = bpy.context.scene.frame_current
@@ -63,18 +166,53 @@ def get_obj_loc(obj, frame):
     return obj_loc  # or local_pos
 
 
+def _shift_keyframes(obj, shift_vector, t_lo, t_hi, extend=False):
+    # shift the location keys inside (t_lo, t_hi) proportionally, and those
+    # after t_hi by the whole shift_vector if extend
+    if obj.animation_data and obj.animation_data.action:
+        for fc in obj.animation_data.action.fcurves:
+            if fc.data_path == "location":
+                for kp in fc.keyframe_points:
+                    if t_lo < kp.co[0] < t_hi:
+                        t = (kp.co[0] - t_lo) / (t_hi - t_lo)
+                        kp.co[1] += shift_vector[fc.array_index] * t
+                    elif extend and (kp.co[0] > t_hi):
+                        kp.co[1] += shift_vector[fc.array_index]
+                fc.update()
+
+
 def animate_linear_shift(
         objects, 
         shift_vector, 
         time_span, 
         shift_existing_keyframes=True,
-        extend=False):
+        extend=False,
+        buffer=None):
     """
     Animate objects shifting their positions over time.
+
+    With a CommandBuffer as buffer, the locations of all objects are read
+    with one frame_set() per end of time_span, instead of two per object,
+    and the new keys are recorded; they are written when the buffer is
+    flushed, which must happen before the objects are evaluated again.
     """
     t_lo, t_hi = time_span
     shift_vector = Vector(shift_vector)
-    
+
+    if buffer is not None:
+        objects = list(objects)
+        bpy.context.scene.frame_set(int(t_lo))
+        locs_lo = np.array([obj.location for obj in objects], dtype=np.float64)
+        bpy.context.scene.frame_set(int(t_hi))
+        locs_hi = (np.array([obj.location for obj in objects], dtype=np.float64)
+                   + np.array(shift_vector))
+        for obj, loc_lo, loc_hi in zip(objects, locs_lo, locs_hi):
+            obj.location = loc_hi.tolist()
+            buffer.keyframe(obj.name, 'location', [t_lo, t_hi], [loc_lo, loc_hi])
+            if shift_existing_keyframes:
+                _shift_keyframes(obj, shift_vector, t_lo, t_hi, extend=extend)
+        return
+
     for obj in objects:
         # Record start position and insert keyframe
         bpy.context.scene.frame_set(int(t_lo))
@@ -89,16 +227,7 @@ def animate_linear_shift(
             continue
         
         # If object has keyframes between start and end, adjust them
-        if obj.animation_data and obj.animation_data.action:
-            for fc in obj.animation_data.action.fcurves:
-                if fc.data_path == "location":
-                    for kp in fc.keyframe_points:
-                        if t_lo < kp.co[0] < t_hi:
-                            t = (kp.co[0] - t_lo) / (t_hi - t_lo)
-                            kp.co[1] += shift_vector[fc.array_index] * t
-                        elif extend and (kp.co[0] > t_hi):
-                            kp.co[1] += shift_vector[fc.array_index]
-                    fc.update()
+        _shift_keyframes(obj, shift_vector, t_lo, t_hi, extend=extend)
 
 
 def insert_pause(t, duration):
@@ -328,10 +457,259 @@ def animate_curve_growth(curve_obj, start_frame=1, end_frame=50, step_width=0.02
 
 
 
-def hide_obj(obj, t, unhide=False):
+def hide_obj(obj, t, unhide=False, buffer=None):
+    """
+    Key obj hidden (or shown, with unhide) from frame t on. With a
+    CommandBuffer as buffer, the keys are recorded without changing frame.
+    """
+    if buffer is not None:
+        for data_path in ('hide_viewport', 'hide_render'):
+            buffer.keyframe(obj.name, data_path, [t], [float(not unhide)], index=0,
+                            interpolation='CONSTANT')
+        return
+
     bpy.context.scene.frame_set(t)
     obj.hide_viewport = not unhide
     obj.hide_render = not unhide
 
     obj.keyframe_insert('hide_viewport', frame=t)
-    obj.keyframe_insert('hide_render', frame=t)
\ No newline at end of file
+    obj.keyframe_insert('hide_render', frame=t)
+
+
+def _decimate_keys_mask(xs, ys, tolerance, constant=False):
+    """
+    Find the keys of a piecewise-linear (or step) curve that can be dropped
+    with the curve moving by at most `tolerance` at every dropped key.
+    Uses iterative Ramer-Douglas-Peucker with vertical distances.
+
+    Both the original and the decimated curves are piecewise linear (or
+    constant) between the original keys, so the error at the keys bounds
+    the error over the whole span.
+
+    Returns:
+        keep: boolean mask of keys to keep
+        errors: reconstruction error at every key (0 for kept keys)
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    n = len(xs)
+    keep = np.ones(n, dtype=bool)
+    errors = np.zeros(n)
+    if n < 3:
+        return keep, errors
+
+    if constant:
+        # a step curve only needs keys where the value changes
+        last_kept = ys[0]
+        for i in range(1, n - 1):
+            if abs(ys[i] - last_kept) <= tolerance:
+                keep[i] = False
+                errors[i] = abs(ys[i] - last_kept)
+            else:
+                last_kept = ys[i]
+        return keep, errors
+
+    keep[1:-1] = False
+    stack = [(0, n - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        if hi - lo < 2:
+            continue
+        inner = slice(lo + 1, hi)
+        dx = xs[hi] - xs[lo]
+        frac = (xs[inner] - xs[lo]) / dx if dx != 0 else np.zeros(hi - lo - 1)
+        err = np.abs(ys[inner] - (ys[lo] + frac * (ys[hi] - ys[lo])))
+        i_max = np.argmax(err)
+        if err[i_max] > tolerance:
+            mid = lo + 1 + i_max
+            keep[mid] = True
+            stack.append((lo, mid))
+            stack.append((mid, hi))
+        else:
+            errors[inner] = err
+
+    return keep, errors
+
+
+def _decimate_bezier_mask(xs, ys, tolerance, candidates):
+    """
+    Find the keys of a run of BEZIER keys with auto handles that can be
+    dropped: a key is dropped if the two kept keys before it, the next two
+    keys and all the original keys between them lie within tolerance / 2 of
+    a line. Auto handles of collinear keys lie on that line, so the curve
+    around the dropped key stays (nearly) straight; the result is checked
+    by evaluating the decimated curve.
+
+    Args:
+        candidates: boolean mask of the keys that may be dropped
+
+    Returns:
+        keep: boolean mask of keys to keep
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    n = len(xs)
+    keep = np.ones(n, dtype=bool)
+    kept = [0, 1]
+    for i in range(2, n - 2):
+        a, d = kept[-2], i + 2
+        if candidates[i] and xs[d] != xs[a]:
+            span = slice(a + 1, d)
+            line = ys[a] + (xs[span] - xs[a]) / (xs[d] - xs[a]) * (ys[d] - ys[a])
+            if np.abs(ys[span] - line).max() <= tolerance / 2:
+                keep[i] = False
+                continue
+        kept.append(i)
+    return keep
+
+
+def _copy_keys(fcurve, target, keep):
+    # write the kept keys of fcurve into the empty fcurve target, with their
+    # interpolation and handles; auto handles are recomputed by update()
+    kps = fcurve.keyframe_points
+    idx = np.flatnonzero(keep)
+    data = {}
+    for attr in ('co', 'handle_left', 'handle_right'):
+        values = np.empty(2 * len(kps), dtype=np.float64)
+        kps.foreach_get(attr, values)
+        data[attr] = values.reshape(-1, 2)[idx].ravel()
+    target.auto_smoothing = fcurve.auto_smoothing
+    target.extrapolation = fcurve.extrapolation
+    target.keyframe_points.add(len(idx))
+    for attr, values in data.items():
+        target.keyframe_points.foreach_set(attr, values)
+    for kp_new, i in zip(target.keyframe_points, idx.tolist()):
+        kp = kps[i]
+        kp_new.interpolation = kp.interpolation
+        kp_new.handle_left_type = kp.handle_left_type
+        kp_new.handle_right_type = kp.handle_right_type
+    target.update()
+
+
+def _max_deviation(fcurve, keep, samples, reference):
+    # evaluate the decimated curve on a throwaway fcurve
+    action = bpy.data.actions.new('polender_decimate_tmp')
+    try:
+        trial = action.fcurves.new('location', index=0)
+        _copy_keys(fcurve, trial, keep)
+        values = np.array([trial.evaluate(f) for f in samples.tolist()])
+    finally:
+        bpy.data.actions.remove(action)
+    return float(np.abs(values - reference).max())
+
+
+def decimate_fcurve(fcurve, tolerance=1e-3, samples_per_key=4):
+    """
+    Remove keyframes of an fcurve that can be reconstructed from their
+    neighbours within `tolerance` (in the units of the animated property),
+    over the whole span of the fcurve.
+
+    CONSTANT runs drop keys that do not change the value and LINEAR runs
+    keys that lie within `tolerance` of the line through the kept
+    neighbours; for these the error at the keys bounds the error everywhere.
+    BEZIER runs drop keys with auto handles in locally straight stretches,
+    e.g. hooks holding still or moving steadily between keyframe_insert()
+    calls. Since removing a key moves the auto handles of its neighbours,
+    the decimated curve is evaluated at samples_per_key points per original
+    segment and compared with the original; if it deviates by more than
+    `tolerance`, only the LINEAR and CONSTANT keys are removed.
+
+    Returns:
+        (n_removed, max_error)
+    """
+    kps = fcurve.keyframe_points
+    n = len(kps)
+    if n < 3:
+        return 0, 0.0
+
+    co = np.empty(2 * n, dtype=np.float64)
+    kps.foreach_get('co', co)
+    xs, ys = co[0::2], co[1::2]
+    interpolations = [kp.interpolation for kp in kps]
+    auto = np.array([kp.handle_left_type in ('AUTO', 'AUTO_CLAMPED')
+                     and kp.handle_right_type in ('AUTO', 'AUTO_CLAMPED') for kp in kps])
+
+    # the interpolation of a key applies to the segment after it: runs of
+    # keys with equal interpolation are decimated up to the key ending the run
+    keep = np.ones(n, dtype=bool)
+    keep_bezier = np.ones(n, dtype=bool)
+    errors = np.zeros(n)
+    run_start = 0
+    for i in range(1, n + 1):
+        if i < n and interpolations[i] == interpolations[run_start]:
+            continue
+        run_end = min(i, n - 1)
+        run = slice(run_start, run_end + 1)
+        if interpolations[run_start] in ('LINEAR', 'CONSTANT'):
+            run_keep, run_errors = _decimate_keys_mask(
+                xs[run], ys[run], tolerance,
+                constant=(interpolations[run_start] == 'CONSTANT'))
+            keep[run] &= run_keep
+            errors[run] = np.maximum(errors[run], run_errors)
+        elif interpolations[run_start] == 'BEZIER':
+            # the handles of a dropped key's neighbours are recomputed
+            candidates = auto[run] & np.roll(auto[run], 1) & np.roll(auto[run], -1)
+            keep_bezier[run] &= _decimate_bezier_mask(xs[run], ys[run], tolerance, candidates)
+        run_start = i
+
+    max_error = float(errors[~keep].max()) if not keep.all() else 0.0
+    if not keep_bezier.all():
+        frac = np.arange(samples_per_key) / samples_per_key
+        samples = np.append((xs[:-1, None] + np.diff(xs)[:, None] * frac).ravel(), xs[-1])
+        reference = np.array([fcurve.evaluate(f) for f in samples.tolist()])
+        deviation = _max_deviation(fcurve, keep & keep_bezier, samples, reference)
+        if deviation <= tolerance:
+            keep &= keep_bezier
+            max_error = max(max_error, deviation)
+
+    to_remove = np.flatnonzero(~keep)
+    if len(to_remove) == 0:
+        return 0, 0.0
+
+    for i in to_remove[::-1]:
+        kps.remove(kps[int(i)], fast=True)
+    fcurve.update()
+
+    return len(to_remove), max_error
+
+
+def decimate_keyframes(objs, tolerance=1e-3, data_paths=None, include_data=True, verbose=False):
+    """
+    Decimate the keyframes of all fcurves of the given objects.
+
+    Args:
+        objs: objects whose actions are decimated
+        tolerance: maximal allowed deviation of an fcurve from the original one
+        data_paths: if given, only fcurves with these data paths are decimated
+            (e.g. ['location'])
+        include_data: also decimate the action of the object data, e.g.
+            the animated control points of a curve
+        verbose: print a summary
+
+    Returns:
+        dict with the number of keys before decimation, the number of removed
+        keys and the maximal error over all fcurves
+    """
+    stats = {'n_keys': 0, 'n_removed': 0, 'max_error': 0.0}
+
+    objs = list(objs)
+    ids = list(objs)
+    if include_data:
+        ids += [obj.data for obj in objs if getattr(obj, 'data', None) is not None]
+
+    for id_ in ids:
+        if not (id_.animation_data and id_.animation_data.action):
+            continue
+        for fcurve in id_.animation_data.action.fcurves:
+            if data_paths is not None and fcurve.data_path not in data_paths:
+                continue
+            stats['n_keys'] += len(fcurve.keyframe_points)
+            n_removed, max_error = decimate_fcurve(fcurve, tolerance=tolerance)
+            stats['n_removed'] += n_removed
+            stats['max_error'] = max(stats['max_error'], max_error)
+
+    if verbose:
+        print(f"Removed {stats['n_removed']} of {stats['n_keys']} keyframes, "
+              f"max error {stats['max_error']:.3g}")
+
+    return stats
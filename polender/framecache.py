@@ -0,0 +1,165 @@
+import queue
+import threading
+import collections
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    LRU cache of preprocessed trajectory frames with a byte budget, and a
+    background thread that prefetches frames ahead of the playhead.
+
+    Frames are keyed by (source.key, frame), where the key of a FrameSource
+    identifies both the trajectory and its transform pipeline, so that the
+    same trajectory shown with different transforms is cached separately.
+
+    The prefetch thread only calls source.read(), so transforms must not
+    touch bpy; NumPy-only transforms (unwrapping, centering, alignment) are
+    safe.
+    """
+
+    def __init__(self, max_bytes=2**30, n_prefetch=8):
+        self.max_bytes = int(max_bytes)
+        self.n_prefetch = int(n_prefetch)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._frames = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._worker = None
+        self._frame_nbytes = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def stats(self):
+        return {
+            'n_frames': len(self._frames),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _lookup(self, key):
+        with self._lock:
+            value = self._frames.get(key)
+            if value is not None:
+                self._frames.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        value = np.ascontiguousarray(value)
+        value.flags.writeable = False
+        self._frame_nbytes = max(self._frame_nbytes, value.nbytes)
+        if value.nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._frames[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return value
+
+    def get(self, source, frame):
+        """A frame of a FrameSource, read and cached on a miss."""
+        frame = source.clamp(frame)
+        key = (source.key, frame)
+        value = self._lookup(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return self.put(key, source.read(frame))
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def _drain(self, source_key=None):
+        # queued requests that are no longer pending are skipped by the worker
+        with self._lock:
+            if source_key is None:
+                self._pending.clear()
+            else:
+                self._pending = {key for key in self._pending if key[0] != source_key}
+        if source_key is None:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def prefetch(self, source, frame, direction=1):
+        """
+        Queue the next n_prefetch frames after `frame` in the playback
+        direction (+1 or -1), replacing any earlier, now stale, requests
+        for the same source; requests for other sources are kept.
+        Prefetching is capped to half of the budget, so that it does not
+        evict the frames around the playhead.
+        """
+        n_prefetch = self.n_prefetch
+        if self._frame_nbytes:
+            n_prefetch = min(n_prefetch, self.max_bytes // (2 * self._frame_nbytes))
+        if n_prefetch <= 0:
+            return
+        self._drain(source.key)
+        self._ensure_worker()
+        step = 1 if direction >= 0 else -1
+        for i in range(1, n_prefetch + 1):
+            f = frame + i * step
+            if not 0 <= f < source.n_frames:
+                break
+            key = (source.key, f)
+            with self._lock:
+                if key in self._frames or key in self._pending:
+                    continue
+                self._pending.add(key)
+            self._queue.put((source, f))
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name='polender-prefetch', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            source, frame = item
+            key = (source.key, frame)
+            with self._lock:
+                if key not in self._pending:
+                    # dropped by a newer prefetch request
+                    continue
+            try:
+                if self._lookup(key) is None:
+                    self.put(key, source.read(frame))
+            except Exception as e:
+                print(f'polender: failed to prefetch frame {frame}: {e}')
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def close(self):
+        """Stop the prefetch thread."""
+        self._drain()
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self._worker = None
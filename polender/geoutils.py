@@ -1,5 +1,8 @@
 import numpy as np
-from mathutils import Vector
+
+# this module imports with NumPy alone, so that its math can run in plain
+# Python worker processes; Blender modules are imported where they are used
+
 
 def set_loc_rot(obj, loc, rot, keyframe_t=None):
     obj.location = loc
@@ -10,7 +13,60 @@ def set_loc_rot(obj, loc, rot, keyframe_t=None):
         obj.keyframe_insert(data_path="rotation_euler", frame = keyframe_t)
 
 
+def set_loc_rot_batch(objs, locs=None, rots=None, frames=None):
+    """
+    Set (and optionally keyframe) locations and rotations of many objects.
+
+    Args:
+        objs: N objects
+        locs: (N, 3) locations, or (F, N, 3) if frames are given
+        rots: (N, 3) Euler angles or (N, 4) (w, x, y, z) quaternions,
+            or (F, N, 3) / (F, N, 4) if frames are given
+        frames: None, a single frame to keyframe the transforms at,
+            or (F,) frames for per-frame transforms.
+            Keyframes are written in bulk, one fcurve at a time.
+    """
+    objs = list(objs)
+    n = len(objs)
+    per_frame = frames is not None and np.ndim(frames) > 0
+    frames = None if frames is None else np.atleast_1d(frames)
+
+    channels = []
+    if locs is not None:
+        locs = np.asarray(locs, dtype=np.float64)
+        channels.append(('location', locs))
+    if rots is not None:
+        rots = np.asarray(rots, dtype=np.float64)
+        quat = rots.shape[-1] == 4
+        channels.append(('rotation_quaternion' if quat else 'rotation_euler', rots))
+        if quat:
+            for obj in objs:
+                obj.rotation_mode = 'QUATERNION'
+
+    for data_path, values in channels:
+        if per_frame:
+            if values.shape[:2] != (len(frames), n):
+                raise ValueError(f"{data_path} must have shape (n_frames, n_objects, ...)")
+            current = values[0]
+        else:
+            if len(values) != n:
+                raise ValueError(f"{data_path} must have one entry per object")
+            current = values
+            values = values[np.newaxis]
+
+        for obj, value in zip(objs, current.tolist()):
+            setattr(obj, data_path, value)
+
+        if frames is None:
+            continue
+        from .dynamics import set_fcurve_keyframes
+        for i, obj in enumerate(objs):
+            for axis in range(values.shape[-1]):
+                set_fcurve_keyframes(obj, data_path, axis, frames, values[:, i, axis])
+
+
 def get_rot_from_vec(vec, axes=('Y','X')):
+    from mathutils import Vector
     return Vector(vec).to_track_quat(*axes).to_euler()
 
 
@@ -24,6 +80,152 @@ def align_four_points(p1, p2, p3, p4):
     return loc, rot
 
 
+_AXES = {'X': 0, 'Y': 1, 'Z': 2}
+
+
+def track_quat_batch(vecs, track='Y', up='X'):
+    """
+    Vectorized Vector.to_track_quat: quaternions (w, x, y, z) that point the
+    `track` axis along each of the (N, 3) vectors, with the `up` axis kept
+    as close as possible to its world direction.
+    """
+    vecs = np.asarray(vecs, dtype=np.float64).reshape(-1, 3)
+    sign = -1.0 if track.startswith('-') else 1.0
+    axis = _AXES[track.lstrip('-')]
+    upflag = _AXES[up]
+
+    tvec = sign * vecs
+    length = np.linalg.norm(vecs, axis=1)
+    safe_len = np.where(length == 0, 1.0, length)
+    eps = 1e-4
+
+    # rotate the track axis onto the vector
+    nor = np.zeros_like(tvec)
+    if axis == 1:
+        nor[:, 0] = tvec[:, 2]
+        nor[:, 2] = -tvec[:, 0]
+        degenerate, fix = np.abs(tvec[:, 0]) + np.abs(tvec[:, 2]) < eps, 2
+    elif axis == 0:
+        nor[:, 1] = -tvec[:, 2]
+        nor[:, 2] = tvec[:, 1]
+        degenerate, fix = np.abs(tvec[:, 1]) + np.abs(tvec[:, 2]) < eps, 1
+    else:
+        nor[:, 0] = -tvec[:, 1]
+        nor[:, 1] = tvec[:, 0]
+        degenerate, fix = np.abs(tvec[:, 0]) + np.abs(tvec[:, 1]) < eps, 0
+    nor[degenerate, fix] = 1.0
+    nor /= np.linalg.norm(nor, axis=1, keepdims=True)
+
+    co = np.clip(tvec[:, axis] / safe_len, -1.0, 1.0)
+    half_angle = np.arccos(co) / 2
+    q = np.concatenate([np.cos(half_angle)[:, None],
+                        nor * np.sin(half_angle)[:, None]], axis=1)
+
+    # then spin around the vector to bring the up axis closest to its world direction
+    if axis != upflag:
+        z_img = quat_to_matrix_batch(q)[:, :, 2]
+        if axis == 0:
+            angle = (0.5 * np.arctan2(z_img[:, 2], z_img[:, 1]) if upflag == 1
+                     else -0.5 * np.arctan2(z_img[:, 1], z_img[:, 2]))
+        elif axis == 1:
+            angle = (-0.5 * np.arctan2(z_img[:, 2], z_img[:, 0]) if upflag == 0
+                     else 0.5 * np.arctan2(z_img[:, 0], z_img[:, 2]))
+        else:
+            angle = (0.5 * np.arctan2(-z_img[:, 1], -z_img[:, 0]) if upflag == 0
+                     else -0.5 * np.arctan2(-z_img[:, 0], -z_img[:, 1]))
+
+        q2 = np.concatenate([np.cos(angle)[:, None],
+                             tvec * (np.sin(angle) / safe_len)[:, None]], axis=1)
+        q = quat_multiply_batch(q2, q)
+
+    q[length == 0] = (1, 0, 0, 0)
+    return q
+
+
+def quat_multiply_batch(q1, q2):
+    """Hamilton products of (N, 4) (w, x, y, z) quaternions."""
+    w1, x1, y1, z1 = np.moveaxis(q1, -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(q2, -1, 0)
+    return np.stack([
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+    ], axis=-1)
+
+
+def quat_to_matrix_batch(q):
+    """(N, 4) (w, x, y, z) quaternions to (N, 3, 3) rotation matrices."""
+    q = np.asarray(q, dtype=np.float64)
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
+
+
+def matrix_to_euler_batch(mats):
+    """
+    (N, 3, 3) rotation matrices to (N, 3) XYZ Euler angles, picking the same
+    one of the two equivalent solutions as Matrix.to_euler().
+    """
+    m = np.asarray(mats, dtype=np.float64)
+    cy = np.hypot(m[:, 0, 0], m[:, 1, 0])
+    regular = cy > 16.0 * np.finfo(np.float32).eps
+
+    eul1 = np.stack([
+        np.where(regular, np.arctan2(m[:, 2, 1], m[:, 2, 2]), np.arctan2(-m[:, 1, 2], m[:, 1, 1])),
+        np.arctan2(-m[:, 2, 0], cy),
+        np.where(regular, np.arctan2(m[:, 1, 0], m[:, 0, 0]), 0.0),
+    ], axis=1)
+    eul2 = np.stack([
+        np.arctan2(-m[:, 2, 1], -m[:, 2, 2]),
+        np.arctan2(-m[:, 2, 0], -cy),
+        np.arctan2(-m[:, 1, 0], -m[:, 0, 0]),
+    ], axis=1)
+    eul2[~regular] = eul1[~regular]
+
+    use2 = np.abs(eul2).sum(axis=1) < np.abs(eul1).sum(axis=1)
+    return np.where(use2[:, None], eul2, eul1)
+
+
+def align_four_points_batch(points, quaternions=False):
+    """
+    Vectorized align_four_points.
+
+    Args:
+        points: (N, 4, 3) array, e.g. the two anchor beads of every loop
+            at every frame
+        quaternions: return (N, 4) quaternions instead of Euler angles
+
+    Returns:
+        (N, 3) locations and (N, 3) XYZ Euler rotations (or (N, 4) quaternions)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    loc = points.mean(axis=1)
+    q = track_quat_batch((points[:, 2] + points[:, 3]) / 2 - loc, 'Y', 'X')
+    if quaternions:
+        return loc, q
+    return loc, matrix_to_euler_batch(quat_to_matrix_batch(q))
+
+
+def align_objects_to_points(objs, points, frames=None):
+    """
+    Place and orient N objects (e.g. SMC markers) by align_four_points rule.
+
+    Args:
+        objs: N objects
+        points: (N, 4, 3) points, or (F, N, 4, 3) if frames are given
+        frames: (F,) frames to keyframe the transforms at
+    """
+    points = np.asarray(points, dtype=np.float64)
+    loc, rot = align_four_points_batch(points.reshape(-1, 4, 3))
+    shape = points.shape[:-2] + (3,)
+    set_loc_rot_batch(objs, loc.reshape(shape), rot.reshape(shape), frames=frames)
+
+
 def alignment_quaternion(axes_obj_vs_world1 = ('Z', 'Y'), axes_obj_vs_world2 = ('Z', 'Y')):
     """
     Create a quaternion rotation to align two object's axis with two given world axes
@@ -35,6 +237,8 @@ def alignment_quaternion(axes_obj_vs_world1 = ('Z', 'Y'), axes_obj_vs_world2 = (
     Returns:
         Quaternion: Rotation to achieve desired alignment
     """
+    from mathutils import Vector
+
     # Convert axis strings to vectors
     axes = {'X': Vector((1,0,0)), 
             'Y': Vector((0,1,0)), 
@@ -66,14 +270,311 @@ def alignment_quaternion(axes_obj_vs_world1 = ('Z', 'Y'), axes_obj_vs_world2 = (
     return final_rot
 
 
-def pca_align(d):
-    # Center the data by subtracting the mean
-    d_centered = d - np.mean(d, axis=0)
+def _subsample(d, subsample):
+    # strided subsampling keeps memory-mapped reads sequential
+    if subsample is None or subsample >= len(d):
+        return d
+    return d[::int(np.ceil(len(d) / subsample))]
+
+
+class PCAAccumulator:
+    """
+    Accumulates the 3x3 scatter matrix of point sets, e.g. the frames of
+    a memory-mapped trajectory, to compute their common principal axes
+    without ever holding more than one frame in memory.
+    Every added point set is centered on its own mean.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.scatter = np.zeros((3, 3))
+
+    def add(self, d, subsample=None):
+        d = np.asarray(_subsample(d, subsample), dtype=np.float64)
+        mean = d.mean(axis=0)
+        self.scatter += d.T @ d - len(d) * np.outer(mean, mean)
+        self.n += len(d)
+        return self
+
+    @property
+    def cov(self):
+        return self.scatter / max(self.n, 1)
+
+    def axes(self, reference_axes=None):
+        return _orient_axes(_eigh_axes(self.cov), reference_axes)
+
+
+def _eigh_axes(cov):
+    # rows are principal axes by decreasing variance
+    _, evecs = np.linalg.eigh(cov)
+    return evecs[:, ::-1].T.copy()
+
+
+def _orient_axes(axes, reference_axes=None):
+    """
+    Fix the arbitrary order and signs of principal axes: match them to
+    reference axes if given (e.g. those of the previous frame), otherwise make
+    the largest component of every axis positive. The third axis is set to the
+    cross product of the first two, so that the alignment is a proper rotation
+    and never mirrors the chromosome.
+    """
+    axes = np.array(axes, dtype=np.float64)
+    if reference_axes is not None:
+        overlap = np.abs(axes @ np.asarray(reference_axes).T)
+        # best permutation of the first two axes by overlap with the reference ones
+        best = max(
+            ((i, j) for i in range(3) for j in range(3) if i != j),
+            key=lambda ij: overlap[ij[0], 0] + overlap[ij[1], 1])
+        axes = axes[list(best)]
+        signs = np.sign(np.einsum('ij,ij->i', axes, np.asarray(reference_axes)[:2]))
+    else:
+        axes = axes[:2]
+        signs = np.sign(axes[np.arange(2), np.argmax(np.abs(axes), axis=1)])
+    signs[signs == 0] = 1
+    axes = axes * signs[:, None]
+    return np.vstack([axes, np.cross(axes[0], axes[1])])
+
+
+def pca_axes(d, subsample=None, reference_axes=None):
+    """
+    Center and principal axes of (N, 3) points from their 3x3 covariance.
+
+    Args:
+        d: (N, 3) points
+        subsample: use only about this many points to compute the axes;
+            the center is always the mean of all points
+        reference_axes: (3, 3) axes to match the order and signs to
+
+    Returns:
+        center (3,) and axes (3, 3), one axis per row
+    """
+    acc = PCAAccumulator().add(d, subsample=subsample)
+    center = np.asarray(d, dtype=np.float64).mean(axis=0)
+    return center, acc.axes(reference_axes)
+
+
+def pca_align(d, subsample=None, reference_axes=None, return_axes=False):
+    """
+    Rotate (N, 3) points into their principal axes frame, centered at the origin.
+    The first coordinate follows the axis of largest variance.
+    """
+    center, axes = pca_axes(d, subsample=subsample, reference_axes=reference_axes)
+    d_pcad = (np.asarray(d) - center) @ axes.T
+    if return_axes:
+        return d_pcad, axes
+    return d_pcad
+
+
+def pca_align_frames(traj, mode='continuous', subsample=None, frames=None):
+    """
+    Lazily yield PCA-aligned frames of a (F, N, 3) trajectory, which can be a
+    memory-mapped array; only one frame is read at a time.
+
+    Args:
+        traj: (F, N, 3) array-like indexable by frame
+        mode: 'global' - one set of axes from the covariance accumulated over
+              all frames (a first pass over the frames), or
+              'continuous' - per-frame axes, with order and signs matched to
+              the previous frame so that the chromosome never flips
+        subsample: use only about this many beads per frame for the axes
+        frames: indices of the frames to align, all frames by default
+    """
+    if mode not in ('global', 'continuous'):
+        raise ValueError("mode must be 'global' or 'continuous'")
+    # frames are iterated twice in global mode
+    frames = range(len(traj)) if frames is None else list(frames)
+    return _pca_align_frames(traj, mode, subsample, frames)
+
+
+def _pca_align_frames(traj, mode, subsample, frames):
+    if mode == 'global':
+        acc = PCAAccumulator()
+        for f in frames:
+            acc.add(traj[f], subsample=subsample)
+        axes = acc.axes()
+        for f in frames:
+            d = np.asarray(traj[f], dtype=np.float64)
+            yield (d - d.mean(axis=0)) @ axes.T
+
+    else:
+        axes = None
+        for f in frames:
+            d = np.asarray(traj[f], dtype=np.float64)
+            center, axes = pca_axes(d, subsample=subsample, reference_axes=axes)
+            yield (d - center) @ axes.T
+
+
+def kabsch_batch(mobile, reference, weights=None):
+    """
+    Optimal rotations superposing each of B point sets onto a reference
+    (batched Kabsch algorithm).
+
+    Args:
+        mobile: (B, N, 3) point sets
+        reference: (N, 3) reference points
+        weights: optional (N,) weights of the points
+
+    Returns:
+        rotations (B, 3, 3), mobile centers (B, 3) and the reference center (3,),
+        such that (mobile - mobile_center) @ R.T + reference_center is superposed
+    """
+    mobile = np.asarray(mobile, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    w = (np.ones(reference.shape[0]) if weights is None
+         else np.asarray(weights, dtype=np.float64))
+    w = w / w.sum()
+
+    mobile_center = np.einsum('n,bnk->bk', w, mobile)
+    reference_center = w @ reference
+
+    covariance = np.einsum(
+        'n,bni,nj->bij',
+        w,
+        mobile - mobile_center[:, None, :],
+        reference - reference_center)
+    U, _, Vt = np.linalg.svd(covariance)
+
+    # avoid reflections
+    d = np.sign(np.linalg.det(U @ Vt))
+    d[d == 0] = 1
+    U[:, :, 2] *= d[:, None]
+    rotations = np.transpose(U @ Vt, (0, 2, 1))
+
+    return rotations, mobile_center, reference_center
+
+
+def superpose_frames(
+        traj,
+        reference=None,
+        ref_beads=None,
+        weights=None,
+        chunk_size=64,
+        out=None):
+    """
+    Remove rigid-body drift and rotation from a trajectory by superposing every
+    frame onto a reference, processing the (possibly memory-mapped) input in
+    chunks of frames.
+
+    Args:
+        traj: (F, N, 3) array
+        reference: (N, 3) reference frame, the first frame by default
+        ref_beads: indices or boolean mask of the beads used to fit the
+            superposition, all beads by default; all beads are transformed
+        weights: optional weights of the reference beads
+        chunk_size: number of frames processed at once
+        out: (F, N, 3) output array, e.g. a writable memmap; a new array by default
+
+    Returns:
+        the superposed trajectory
+    """
+    n_frames = len(traj)
+    if reference is None:
+        reference = traj[0]
+    reference = np.asarray(reference, dtype=np.float64)
+    sel = slice(None) if ref_beads is None else ref_beads
+    reference_sel = reference[sel]
+
+    if out is None:
+        dtype = np.result_type(getattr(traj, 'dtype', np.float64), np.float32)
+        out = np.empty((n_frames,) + reference.shape, dtype=dtype)
+
+    for lo in range(0, n_frames, chunk_size):
+        chunk = np.asarray(traj[lo:lo + chunk_size], dtype=np.float64)
+        rotations, mobile_center, reference_center = kabsch_batch(
+            chunk[:, sel], reference_sel, weights=weights)
+        out[lo:lo + chunk_size] = (
+            np.einsum('bnj,bij->bni', chunk - mobile_center[:, None, :], rotations)
+            + reference_center)
+
+    return out
+
+
+def box_matrix(box):
+    """
+    (3, 3) matrix with the box vectors as columns, from a HOOMD box
+    [Lx, Ly, Lz, xy, xz, yz] (or [Lx, Ly, Lz] for an orthorhombic box).
+    """
+    box = np.asarray(box, dtype=np.float64)
+    Lx, Ly, Lz = box[:3]
+    xy, xz, yz = box[3:6] if len(box) >= 6 else (0.0, 0.0, 0.0)
+    return np.array([
+        [Lx, xy * Ly, xz * Lz],
+        [0.0, Ly, yz * Lz],
+        [0.0, 0.0, Lz],
+    ])
+
+
+def chains_from_bonds(bonds, n_particles):
+    """
+    Find chains of consecutively numbered particles connected by (i, i+1) bonds.
+
+    Returns:
+        (K, 2) array of [start, end) index ranges of the chains
+    """
+    bonds = np.sort(np.asarray(bonds, dtype=np.int64).reshape(-1, 2), axis=1)
+    linked = np.zeros(n_particles, dtype=bool)
+    consecutive = bonds[:, 1] - bonds[:, 0] == 1
+    # linked[i]: bead i is bonded to bead i+1
+    linked[bonds[consecutive, 0]] = True
+
+    edges = np.diff(np.concatenate([[0], linked[:-1].astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) + 1
+    return np.stack([starts, ends], axis=1)
+
+
+def unwrap_positions(pos, box, chains=None, images=None):
+    """
+    Undo periodic boundary wrapping of polymer chains.
+
+    With images, positions are shifted by their image flags. Otherwise, every
+    bond vector along a chain is replaced by its minimum image and the chain
+    is rebuilt by a cumulative sum from its first bead, for all chains and
+    frames at once.
+
+    Args:
+        pos: (N, 3) positions, or (F, N, 3) for many frames
+        box: HOOMD box [Lx, Ly, Lz, xy, xz, yz], or (F, 6) per frame
+        chains: (K, 2) [start, end) ranges of the chains; beads outside of
+            chains are left in place. By default, all beads form one chain.
+        images: (N, 3) or (F, N, 3) integer image flags
+
+    Returns:
+        unwrapped positions, same shape as pos
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    box = np.asarray(box, dtype=np.float64)
+    if box.ndim == 1:
+        h = box_matrix(box)
+    else:
+        # one box per frame, broadcast over beads
+        h = np.stack([box_matrix(b) for b in box])[:, None]
+
+    def to_cartesian(frac):
+        return (h @ frac[..., None])[..., 0]
+
+    if images is not None:
+        return pos + to_cartesian(np.asarray(images, dtype=np.float64))
+
+    n = pos.shape[-2]
+    if chains is None:
+        chains = np.array([[0, n]])
+    chains = np.asarray(chains, dtype=np.int64).reshape(-1, 2)
 
-    # Perform SVD
-    U, S, Vt = np.linalg.svd(d_centered, full_matrices=False)
+    # index of the first bead of the chain of every bead
+    start_idx = np.arange(n)
+    chain_id = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(chain_id, chains[:, 0], np.arange(1, len(chains) + 1))
+    np.add.at(chain_id, chains[:, 1], -np.arange(1, len(chains) + 1))
+    chain_id = np.cumsum(chain_id)[:n]
+    in_chain = chain_id > 0
+    start_idx[in_chain] = chains[chain_id[in_chain] - 1, 0]
 
-    # Project the data onto the first 3 principal components
-    d_pcad = np.dot(d_centered, Vt.T[:, :3])
+    # minimum-image bond vectors
+    dx = np.zeros_like(pos)
+    dx[..., 1:, :] = np.diff(pos, axis=-2)
+    frac = (np.linalg.inv(h) @ dx[..., None])[..., 0]
+    dx = to_cartesian(frac - np.round(frac))
 
-    return d_pcad
\ No newline at end of file
+    csum = np.cumsum(dx, axis=-2)
+    return pos[..., start_idx, :] + csum - csum[..., start_idx, :]
@@ -0,0 +1,219 @@
+import numpy as np
+
+
+METHODS = ('linear', 'cubic', 'catmull_rom')
+
+
+def _frame_reader(traj):
+    # GSDTrajectory, FrameSource or an (F, N, 3) array
+    if hasattr(traj, 'positions'):
+        return traj.positions, len(traj)
+    if callable(getattr(traj, 'clamp', None)):
+        return traj.read, len(traj)
+    traj = np.asarray(traj)
+    return traj.__getitem__, len(traj)
+
+
+def _hermite_basis(u):
+    u2 = u * u
+    u3 = u2 * u
+    return 2 * u3 - 3 * u2 + 1, u3 - 2 * u2 + u, -2 * u3 + 3 * u2, u3 - u2
+
+
+class TrajectoryInterpolator:
+    """
+    Interpolates a trajectory of (N, 3) frames saved at sparse times to
+    arbitrary output times, vectorized over beads and output times.
+
+    Methods:
+        'linear': piecewise linear.
+        'catmull_rom': piecewise cubic Hermite with finite-difference
+            tangents (Catmull-Rom for uniform times); local, only reads the
+            4 frames around every output time, so it suits streaming.
+        'cubic': natural cubic spline (C2 smooth); its second derivatives
+            are solved once over the whole trajectory, which is kept in
+            memory, or, with `window`, only over the `window` frames on
+            either side of the segment being evaluated.
+
+    Times outside the saved range are clamped to the first or last frame.
+
+    With window=w, 'cubic' holds only 2 * w + 2 frames at a time, as needed
+    for streaming. The influence of a frame on a natural spline decays
+    ~3.7x per frame, so with w=4 it stays within ~0.1% of the global spline.
+
+    Example:
+        interp = TrajectoryInterpolator(ds, times=np.arange(len(ds)) * 10)
+        ds_smooth = interp.sample(np.arange(0, 10 * (len(ds) - 1) + 1))
+    """
+
+    def __init__(self, traj, times=None, method='linear', chunk_size=None, window=None):
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+        self.method = method
+        self._read, self.n_frames = _frame_reader(traj)
+        if self.n_frames == 0:
+            raise ValueError("cannot interpolate an empty trajectory")
+
+        self.times = (np.arange(self.n_frames, dtype=np.float64) if times is None
+                      else np.asarray(times, dtype=np.float64).ravel())
+        if len(self.times) != self.n_frames:
+            raise ValueError("the number of times must match the number of frames")
+        if np.any(np.diff(self.times) <= 0):
+            raise ValueError("times must be strictly increasing")
+
+        self.window = window
+        self._chunk_size = chunk_size
+        self._second_derivs = None
+        # (lo, hi, second derivatives) of the last local spline
+        self._local = None
+        if method == 'cubic' and self.n_frames > 2 and window is None:
+            self._second_derivs = self._solve_spline(0, self.n_frames, chunk_size)
+
+    def _frames(self, idx):
+        idx = np.asarray(idx)
+        uniq, inverse = np.unique(idx, return_inverse=True)
+        frames = np.stack([np.asarray(self._read(int(i)), dtype=np.float64) for i in uniq])
+        return frames[inverse.reshape(idx.shape)]
+
+    def _solve_spline(self, lo_frame, hi_frame, chunk_size=None):
+        # natural cubic spline through frames [lo_frame, hi_frame): tridiagonal
+        # system for the second derivatives, solved with the Thomas algorithm;
+        # the coefficients depend only on the times, the right-hand sides are
+        # swept over all beads at once
+        F = hi_frame - lo_frame
+        h = np.diff(self.times[lo_frame:hi_frame])
+        lower = h[:-1]
+        diag = 2 * (h[:-1] + h[1:])
+        upper = h[1:]
+
+        c = np.zeros(F - 2)
+        denom = np.zeros(F - 2)
+        denom[0] = diag[0]
+        c[0] = upper[0] / denom[0]
+        for i in range(1, F - 2):
+            denom[i] = diag[i] - lower[i] * c[i - 1]
+            c[i] = upper[i] / denom[i]
+
+        first = np.asarray(self._read(lo_frame))
+        n_beads = len(first)
+        chunk_size = n_beads if chunk_size is None else chunk_size
+        M = np.zeros((F,) + first.shape, dtype=np.float64)
+        for lo in range(0, n_beads, chunk_size):
+            p = np.stack([np.asarray(self._read(i), dtype=np.float64)[lo:lo + chunk_size]
+                          for i in range(lo_frame, hi_frame)])
+            slopes = np.diff(p, axis=0) / h[:, None, None]
+            rhs = 6 * (slopes[1:] - slopes[:-1])
+
+            d = np.empty_like(rhs)
+            d[0] = rhs[0] / denom[0]
+            for i in range(1, F - 2):
+                d[i] = (rhs[i] - lower[i] * d[i - 1]) / denom[i]
+            m = M[1:-1, lo:lo + chunk_size]
+            m[-1] = d[-1]
+            for i in range(F - 4, -1, -1):
+                m[i] = d[i] - c[i] * m[i + 1]
+        return M
+
+    def _local_second_derivs(self, i):
+        # second derivatives at the ends of the segments i, each from a
+        # natural spline over the frames within `window` of its segment
+        M0 = M1 = None
+        for seg in np.unique(i):
+            lo = max(0, seg - self.window)
+            hi = min(self.n_frames, seg + self.window + 2)
+            # a local reference, as prefetch threads may replace the cache
+            local = self._local
+            if local is None or local[:2] != (lo, hi):
+                M = (self._solve_spline(lo, hi, self._chunk_size) if hi - lo > 2
+                     else np.zeros((hi - lo,) + np.shape(self._read(lo))))
+                local = self._local = (lo, hi, M)
+            M = local[2]
+            if M0 is None:
+                M0 = np.empty((len(i),) + M.shape[1:])
+                M1 = np.empty_like(M0)
+            mask = i == seg
+            M0[mask] = M[seg - lo]
+            M1[mask] = M[seg + 1 - lo]
+        return M0, M1
+
+    def _segments(self, t):
+        t = np.clip(np.asarray(t, dtype=np.float64), self.times[0], self.times[-1])
+        i = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, self.n_frames - 2)
+        dt = self.times[i + 1] - self.times[i]
+        return i, t, dt
+
+    def _evaluate(self, t):
+        if self.n_frames == 1:
+            return np.repeat(self._frames([0]), len(t), axis=0)
+
+        i, t, dt = self._segments(t)
+        u = ((t - self.times[i]) / dt)[:, None, None]
+        p0, p1 = self._frames(i), self._frames(i + 1)
+
+        if self.method == 'linear' or (self.method == 'cubic' and self.n_frames <= 2):
+            return p0 + u * (p1 - p0)
+
+        if self.method == 'cubic':
+            if self._second_derivs is not None:
+                M0, M1 = self._second_derivs[i], self._second_derivs[i + 1]
+            else:
+                M0, M1 = self._local_second_derivs(i)
+            h = dt[:, None, None]
+            a, b = 1 - u, u
+            return (a * p0 + b * p1
+                    + ((a ** 3 - a) * M0 + (b ** 3 - b) * M1) * h * h / 6)
+
+        # catmull_rom: tangents from central differences of the neighbours
+        last = self.n_frames - 1
+        i_prev, i_next = np.maximum(i - 1, 0), np.minimum(i + 2, last)
+        p_prev, p_next = self._frames(i_prev), self._frames(i_next)
+        t_prev, t0, t1, t_next = (self.times[i_prev], self.times[i],
+                                  self.times[i + 1], self.times[i_next])
+        m0 = (p1 - p_prev) / (t1 - t_prev)[:, None, None]
+        m1 = (p_next - p0) / (t_next - t0)[:, None, None]
+        h00, h10, h01, h11 = _hermite_basis(u)
+        h = dt[:, None, None]
+        return h00 * p0 + h10 * h * m0 + h01 * p1 + h11 * h * m1
+
+    def __call__(self, t):
+        """(N, 3) coordinates at a single time."""
+        return self._evaluate(np.atleast_1d(t))[0]
+
+    def sample(self, out_times, max_memory=2**28, out=None):
+        """
+        Coordinates at many output times, as a (T, N, 3) array.
+
+        Output times are processed in chunks so that the temporary arrays
+        stay below ~max_memory bytes.
+        """
+        out_times = np.asarray(out_times, dtype=np.float64).ravel()
+        frame_nbytes = np.asarray(self._read(0)).size * 8
+        # ~ 8 temporary (chunk, N, 3) float64 arrays
+        chunk = max(1, int(max_memory // (8 * frame_nbytes)))
+        for lo in range(0, len(out_times), chunk):
+            d = self._evaluate(out_times[lo:lo + chunk])
+            if out is None:
+                out = np.empty((len(out_times),) + d.shape[1:], dtype=d.dtype)
+            out[lo:lo + len(d)] = d
+        return out
+
+
+def interpolate_frames(traj, times=None, out_times=None, method='linear', max_memory=2**28):
+    """
+    Upsample a (F, N, 3) trajectory saved at `times` to `out_times`.
+
+    Args:
+        traj: (F, N, 3) array, GSDTrajectory or FrameSource
+        times: (F,) times of the frames, 0..F-1 by default
+        out_times: output times; by default 10 steps between saved frames
+        method: 'linear', 'cubic' or 'catmull_rom'
+        max_memory: approximate cap in bytes on temporary arrays
+
+    Returns:
+        (T, N, 3) array
+    """
+    interp = TrajectoryInterpolator(traj, times=times, method=method)
+    if out_times is None:
+        out_times = np.linspace(interp.times[0], interp.times[-1],
+                                10 * (interp.n_frames - 1) + 1)
+    return interp.sample(out_times, max_memory=max_memory)
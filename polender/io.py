@@ -0,0 +1,247 @@
+import types
+
+import numpy as np
+
+from .geoutils import chains_from_bonds, unwrap_positions
+
+
+GSD_MAGIC = 0x65DF65DF65DF65DF
+
+_GSD_HEADER_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('index_location', '<u8'),
+    ('index_allocated_entries', '<u8'),
+    ('namelist_location', '<u8'),
+    ('namelist_allocated_entries', '<u8'),
+    ('schema_version', '<u4'),
+    ('gsd_version', '<u4'),
+    ('application', 'S64'),
+    ('schema', 'S64'),
+    ('reserved', 'S80'),
+])
+
+_GSD_INDEX_DTYPE = np.dtype([
+    ('frame', '<u8'),
+    ('N', '<u8'),
+    ('location', '<i8'),
+    ('M', '<u4'),
+    ('id', '<u2'),
+    ('type', 'u1'),
+    ('flags', 'u1'),
+])
+
+_GSD_NAME_SIZE = 64
+
+_GSD_TYPES = {
+    1: np.uint8,
+    2: np.uint16,
+    3: np.uint32,
+    4: np.uint64,
+    5: np.int8,
+    6: np.int16,
+    7: np.int32,
+    8: np.int64,
+    9: np.float32,
+    10: np.float64,
+    11: np.uint8,  # character
+}
+
+_GSD_CHARACTER = 11
+
+
+class GSDTrajectory:
+    """
+    Lazy, memory-mapped reader of GSD (e.g. HOOMD-blue) trajectories.
+
+    Opening a file only reads its index; chunks (e.g. 'particles/position')
+    are returned as read-only NumPy views into the memory-mapped file, so only
+    the pages of the frames actually accessed are ever read from disk.
+
+    Following the HOOMD schema, a chunk missing from a frame is taken from
+    frame 0 (e.g. bonds are often written only once).
+
+    Example:
+        traj = GSDTrajectory('traj.gsd')
+        d = traj.positions(-1)
+        snap = traj.snapshot(-1)
+        bonds = snap.bonds.group[snap.bonds.typeid == snap.bonds.types.index('polymer')]
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+
+        header = self._mm[:_GSD_HEADER_DTYPE.itemsize].view(_GSD_HEADER_DTYPE)[0]
+        if int(header['magic']) != GSD_MAGIC:
+            raise ValueError(f"{path} is not a GSD file")
+        self.gsd_version = (int(header['gsd_version']) >> 16, int(header['gsd_version']) & 0xffff)
+        self.schema = header['schema'].decode()
+        self.application = header['application'].decode()
+
+        index_start = int(header['index_location'])
+        index = self._mm[
+            index_start:
+            index_start + int(header['index_allocated_entries']) * _GSD_INDEX_DTYPE.itemsize
+        ].view(_GSD_INDEX_DTYPE)
+        index = np.array(index[index['location'] != 0])
+
+        names_start = int(header['namelist_location'])
+        names = bytes(self._mm[
+            names_start:
+            names_start + int(header['namelist_allocated_entries']) * _GSD_NAME_SIZE])
+        if self.gsd_version[0] >= 2:
+            # packed null-terminated strings
+            names = names.split(b'\x00')
+        else:
+            # fixed-size entries
+            names = [names[i:i + _GSD_NAME_SIZE].split(b'\x00')[0]
+                     for i in range(0, len(names), _GSD_NAME_SIZE)]
+        self.names = []
+        for name in names:
+            if not name:
+                break
+            self.names.append(name.decode())
+
+        # per chunk name: index entries sorted by frame, for searchsorted lookups
+        self._chunks = {}
+        order = np.lexsort((index['frame'], index['id']))
+        index = index[order]
+        bounds = np.flatnonzero(np.diff(index['id'])) + 1
+        for entries in np.split(index, bounds):
+            if len(entries):
+                self._chunks[self.names[entries['id'][0]]] = entries
+
+        self.n_frames = int(index['frame'].max()) + 1 if len(index) else 0
+
+    def __len__(self):
+        return self.n_frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._mm = None
+        self._chunks = {}
+
+    def _frame_idx(self, frame):
+        frame = int(frame)
+        if frame < 0:
+            frame += self.n_frames
+        if not 0 <= frame < self.n_frames:
+            raise IndexError(f"frame {frame} out of range for {self.n_frames} frames")
+        return frame
+
+    def chunk_names(self, frame=None):
+        """Names of the chunks in the file, or only of those written in a frame."""
+        if frame is None:
+            return list(self._chunks)
+        frame = self._frame_idx(frame)
+        return [name for name, entries in self._chunks.items()
+                if frame in entries['frame']]
+
+    def has_chunk(self, name, frame=0):
+        entries = self._chunks.get(name)
+        if entries is None:
+            return False
+        return self._find(entries, self._frame_idx(frame)) is not None
+
+    @staticmethod
+    def _find(entries, frame):
+        i = np.searchsorted(entries['frame'], frame)
+        if i < len(entries) and entries['frame'][i] == frame:
+            return entries[i]
+        return None
+
+    def chunk(self, name, frame, default=None, fallback_to_first=True):
+        """
+        Read-only view of a chunk in a frame: an (N, M) array, (N,) if M == 1.
+        Character chunks and type names are returned as lists of strings.
+        """
+        entries = self._chunks.get(name)
+        if entries is None:
+            return default
+        frame = self._frame_idx(frame)
+        entry = self._find(entries, frame)
+        if entry is None and fallback_to_first:
+            entry = self._find(entries, 0)
+        if entry is None:
+            return default
+
+        dtype = np.dtype(_GSD_TYPES[int(entry['type'])]).newbyteorder('<')
+        N, M, location = int(entry['N']), int(entry['M']), int(entry['location'])
+        data = self._mm[location:location + N * M * dtype.itemsize].view(dtype)
+
+        # HOOMD stores type names as int8 arrays of null-padded strings
+        if int(entry['type']) == _GSD_CHARACTER or (
+                name.endswith('/types') and dtype.itemsize == 1):
+            return [bytes(row).split(b'\x00')[0].decode() for row in data.reshape(N, M)]
+        return data.reshape(N, M) if M > 1 else data
+
+    def frame(self, frame, fields=('particles/position',)):
+        """Dict of the requested chunks of a frame."""
+        return {name: self.chunk(name, frame) for name in fields}
+
+    def positions(self, frame):
+        return self.chunk('particles/position', frame)
+
+    def iter_frames(self, frames=None, field='particles/position'):
+        """Lazily yield one chunk for a range of frames (all frames by default)."""
+        frames = range(self.n_frames) if frames is None else frames
+        if isinstance(frames, slice):
+            frames = range(*frames.indices(self.n_frames))
+        for frame in frames:
+            yield self.chunk(field, frame)
+
+    def read(self, frames=None, field='particles/position', out=None):
+        """Stack one chunk over a range of frames into a (F, ...) array."""
+        frames = range(self.n_frames) if frames is None else frames
+        if isinstance(frames, slice):
+            frames = range(*frames.indices(self.n_frames))
+        for i, data in enumerate(self.iter_frames(frames, field=field)):
+            if out is None:
+                out = np.empty((len(frames),) + data.shape, dtype=data.dtype)
+            out[i] = data
+        return out
+
+    def snapshot(self, frame, groups=('configuration', 'particles', 'bonds')):
+        """
+        A snapshot of a frame in the layout of gsd.hoomd frames, e.g.
+        snap.particles.position or snap.bonds.group, holding views into the file.
+        """
+        frame = self._frame_idx(frame)
+        snap = types.SimpleNamespace()
+        for group in groups:
+            setattr(snap, group, types.SimpleNamespace())
+        for name in self._chunks:
+            group, _, field = name.partition('/')
+            if group in groups and field:
+                setattr(getattr(snap, group), field, self.chunk(name, frame))
+        return snap
+
+
+def unwrap_chains(snap, bond_types=None, use_images=True):
+    """
+    Unwrapped positions and chains of a snapshot, e.g. from GSDTrajectory.snapshot.
+
+    Args:
+        snap: snapshot with particles.position, configuration.box and bonds
+        bond_types: names of the bond types that form chains, all by default
+        use_images: use the image flags of the snapshot if present,
+            otherwise unwrap along bonds with minimum-image bond vectors
+
+    Returns:
+        (N, 3) unwrapped positions and (K, 2) [start, end) ranges of the chains
+    """
+    pos = np.asarray(snap.particles.position)
+    bonds = np.asarray(snap.bonds.group, dtype=np.int64).reshape(-1, 2)
+    if bond_types is not None:
+        type_ids = [snap.bonds.types.index(bond_type) for bond_type in bond_types]
+        bonds = bonds[np.isin(snap.bonds.typeid, type_ids)]
+    chains = chains_from_bonds(bonds, len(pos))
+
+    images = getattr(snap.particles, 'image', None) if use_images else None
+    d = unwrap_positions(pos, snap.configuration.box, chains=chains, images=images)
+    return d, chains
@@ -0,0 +1,378 @@
+import numpy as np
+
+
+class LoopTrajectory:
+    """
+    Trajectories of many loop extruders (LEFs) stored as flat NumPy arrays.
+
+    Each row is one keyframe of one LEF: the time, the left anchor and the
+    (exclusive) right anchor of its loop, i.e. the loop spans
+    ``hooks[left:right]``, plus the LEF id and its vertical orientation (+1/-1).
+    Rows are kept sorted by (LEF id, time).
+
+    The dict format used across polender, ``{time: (left, right)}`` with one
+    dict per LEF, converts to and from this class via `from_dicts`/`to_dicts`.
+    """
+
+    def __init__(self, times, lefts, rights, lef_ids=None, orientations=None):
+        times = np.asarray(times)
+        if not np.issubdtype(times.dtype, np.integer):
+            times = times.astype(np.float64)
+        n = len(times)
+
+        self.times = times
+        self.lefts = np.asarray(lefts, dtype=np.int64).reshape(n)
+        self.rights = np.asarray(rights, dtype=np.int64).reshape(n)
+        self.lef_ids = (np.zeros(n, dtype=np.int64) if lef_ids is None
+                        else np.asarray(lef_ids, dtype=np.int64).reshape(n))
+        self.orientations = (np.ones(n, dtype=np.int8) if orientations is None
+                             else np.broadcast_to(
+                                 np.asarray(orientations, dtype=np.int8), (n,)).copy())
+
+        order = np.lexsort((self.times, self.lef_ids))
+        if not np.all(order == np.arange(n)):
+            for attr in ('times', 'lefts', 'rights', 'lef_ids', 'orientations'):
+                setattr(self, attr, np.ascontiguousarray(getattr(self, attr)[order]))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return f'LoopTrajectory(n_lefs={len(self.lefs)}, n_keyframes={len(self)})'
+
+    @property
+    def lefs(self):
+        """Unique LEF ids, sorted."""
+        return np.unique(self.lef_ids)
+
+    @property
+    def loops(self):
+        """(N, 2) array of (left, right) anchors."""
+        return np.stack([self.lefts, self.rights], axis=1)
+
+    @classmethod
+    def from_dict(cls, loop_traj, lef_id=0, orientation=1):
+        """
+        Build a trajectory from a single {time: (left, right)} dict.
+
+        A None loop at the first time is inferred as a two-sided loading event
+        at the middle of the next loop, as in `normalize_loop_traj`.
+        """
+        if not isinstance(loop_traj, dict):
+            raise ValueError("loop_traj must be a dictionary {time: (start_loop, end_loop)}")
+        if len(loop_traj) == 0:
+            return cls([], [], [])
+
+        items = sorted(loop_traj.items(), key=lambda x: x[0])
+        times = [t for t, _ in items]
+        loops = [loop for _, loop in items]
+
+        if loops[0] is None:
+            if len(loops) < 2 or loops[1] is None:
+                raise ValueError("cannot infer the loading position of a loop without a next loop")
+            mid_next_loop = (loops[1][0] + loops[1][1]) // 2
+            loops[0] = (mid_next_loop, mid_next_loop + 1)
+        if any(loop is None for loop in loops[1:]):
+            raise ValueError("only the first loop of a trajectory can be None")
+
+        loops = np.asarray(loops, dtype=np.int64).reshape(-1, 2)
+        n = len(times)
+        return cls(
+            times,
+            loops[:, 0],
+            loops[:, 1],
+            lef_ids=np.full(n, lef_id, dtype=np.int64),
+            orientations=np.full(n, orientation, dtype=np.int8))
+
+    @classmethod
+    def from_dicts(cls, loops_traj, orientations=None):
+        """
+        Build a trajectory from a dict or a list of {time: (left, right)} dicts.
+        The LEF id of every dict is its position in the list.
+        """
+        if isinstance(loops_traj, dict):
+            loops_traj = [loops_traj]
+        if orientations is None:
+            orientations = [1] * len(loops_traj)
+        if len(orientations) != len(loops_traj):
+            raise ValueError("the number of orientations must match the number of loop trajectories")
+
+        return cls.concatenate([
+            cls.from_dict(lt, lef_id=i, orientation=vo)
+            for i, (lt, vo) in enumerate(zip(loops_traj, orientations))
+        ])
+
+    def to_dict(self, lef_id):
+        """Convert the trajectory of one LEF into a {time: (left, right)} dict."""
+        mask = self.lef_ids == lef_id
+        return {
+            t: (l, r) for t, l, r in zip(
+                self.times[mask].tolist(),
+                self.lefts[mask].tolist(),
+                self.rights[mask].tolist())
+        }
+
+    def to_dicts(self):
+        """Convert into a list of {time: (left, right)} dicts, one per LEF."""
+        return [self.to_dict(lef_id) for lef_id in self.lefs]
+
+    def orientations_per_lef(self):
+        """Vertical orientation of every LEF, in the order of `lefs`."""
+        _, first = np.unique(self.lef_ids, return_index=True)
+        return self.orientations[first]
+
+    def _take(self, idx):
+        return LoopTrajectory(
+            self.times[idx],
+            self.lefts[idx],
+            self.rights[idx],
+            lef_ids=self.lef_ids[idx],
+            orientations=self.orientations[idx])
+
+    @classmethod
+    def concatenate(cls, trajs, relabel=False):
+        """
+        Merge several trajectories into one.
+
+        If relabel is True, LEF ids of every trajectory are offset so that they
+        do not collide with the ids of the preceding ones.
+        """
+        trajs = list(trajs)
+        if len(trajs) == 0:
+            return cls([], [], [])
+
+        lef_ids = []
+        offset = 0
+        for traj in trajs:
+            lef_ids.append(traj.lef_ids + offset)
+            if relabel and len(traj):
+                offset = lef_ids[-1].max() + 1
+
+        return cls(
+            np.concatenate([traj.times for traj in trajs]),
+            np.concatenate([traj.lefts for traj in trajs]),
+            np.concatenate([traj.rights for traj in trajs]),
+            lef_ids=np.concatenate(lef_ids),
+            orientations=np.concatenate([traj.orientations for traj in trajs]))
+
+    def merge(self, other, relabel=True):
+        return LoopTrajectory.concatenate([self, other], relabel=relabel)
+
+    def time_window(self, t_lo=None, t_hi=None):
+        """Keyframes with t_lo <= time <= t_hi."""
+        mask = np.ones(len(self), dtype=bool)
+        if t_lo is not None:
+            mask &= self.times >= t_lo
+        if t_hi is not None:
+            mask &= self.times <= t_hi
+        return self._take(mask)
+
+    def select_lefs(self, lef_ids):
+        return self._take(np.isin(self.lef_ids, lef_ids))
+
+    def transitions(self):
+        """
+        Consecutive keyframe pairs of every LEF.
+
+        Returns:
+            dict of arrays, one entry per transition, in (LEF id, time) order:
+            lef_id, orientation, t_lo, t_hi, prev_left, prev_right, next_left,
+            next_right, final_left, final_right (the last loop of the LEF).
+        """
+        same_lef = self.lef_ids[1:] == self.lef_ids[:-1]
+        lo = np.flatnonzero(same_lef)
+        hi = lo + 1
+
+        # index of the last keyframe of every LEF
+        last = np.flatnonzero(np.append(~same_lef, True)) if len(self) else lo
+        lef_last = last[np.searchsorted(self.lef_ids[last], self.lef_ids[lo])]
+
+        return {
+            'lef_id': self.lef_ids[lo],
+            'orientation': self.orientations[lo],
+            't_lo': self.times[lo],
+            't_hi': self.times[hi],
+            'prev_left': self.lefts[lo],
+            'prev_right': self.rights[lo],
+            'next_left': self.lefts[hi],
+            'next_right': self.rights[hi],
+            'final_left': self.lefts[lef_last],
+            'final_right': self.rights[lef_last],
+        }
+
+    def held_rows(self, times=None):
+        """
+        Row index of the keyframe holding the loop of every LEF at every time,
+        i.e. its latest keyframe at or before that time, or -1 before the
+        LEF's first keyframe.
+
+        Args:
+            times: (T,) sorted times, by default the union of all keyframe times
+
+        Returns:
+            (L, T) array of row indices, LEFs in the order of `lefs`
+        """
+        grid = np.unique(self.times) if times is None else np.asarray(times)
+        lefs, lef_index = np.unique(self.lef_ids, return_inverse=True)
+        if len(self) == 0 or len(grid) == 0:
+            return np.full((len(lefs), len(grid)), -1, dtype=np.int64)
+
+        # rows are sorted by (LEF, time), so (LEF, time rank) keys are sorted too;
+        # ranks count the grid times at or before each keyframe
+        n_t = len(grid) + 1
+        keys = lef_index * n_t + np.searchsorted(grid, self.times, side='right')
+        queries = (np.arange(len(lefs))[:, None] * n_t
+                   + np.arange(1, len(grid) + 1)[None, :])
+        rows = np.searchsorted(keys, queries, side='right') - 1
+        valid = (rows >= 0) & (lef_index[np.maximum(rows, 0)] == np.arange(len(lefs))[:, None])
+        return np.where(valid, rows, -1)
+
+    def find_overlaps(self, allow_nested=True, max_memory=2**26):
+        """
+        Find pairs of loops of different LEFs that overlap at the same time.
+
+        Every LEF holds its latest loop until its next keyframe, so loops are
+        compared at every keyframe time of any LEF, not only between
+        keyframes with equal times. Nested loops (one loop fully inside
+        another) are allowed by default, since LEFs can extrude over each
+        other; only crossing loops are reported.
+
+        Returns:
+            (K, 2) array of row indices (i, j) of the overlapping keyframes,
+            in the order of the first time they overlap.
+        """
+        rows = self.held_rows()
+        n_lefs, n_times = rows.shape
+        chunk = max(1, max_memory // max(8 * n_lefs * n_lefs, 1))
+
+        out = []
+        for lo in range(0, n_times, chunk):
+            # (T, L) held loops of a chunk of times
+            held = rows[:, lo:lo + chunk].T
+            active = held >= 0
+            l = np.where(active, self.lefts[held], 0)
+            r = np.where(active, self.rights[held], 0)
+            intersect = (l[:, :, None] < r[:, None, :]) & (l[:, None, :] < r[:, :, None])
+            if allow_nested:
+                nested = (((l[:, :, None] <= l[:, None, :]) & (r[:, None, :] <= r[:, :, None]))
+                          | ((l[:, None, :] <= l[:, :, None]) & (r[:, :, None] <= r[:, None, :])))
+                intersect &= ~nested
+            intersect &= active[:, :, None] & active[:, None, :]
+            t, a, b = np.nonzero(np.triu(intersect, k=1))
+            if len(t):
+                out.append(np.stack([held[t, a], held[t, b]], axis=1))
+
+        if not out:
+            return np.zeros((0, 2), dtype=np.int64)
+        pairs = np.concatenate(out)
+        _, first = np.unique(pairs, axis=0, return_index=True)
+        return pairs[np.sort(first)]
+
+    def validate(self, n_hooks=None, allow_nested=True):
+        """
+        Check that all loops are non-empty, lie within [0, n_hooks] and that
+        loops of different LEFs do not cross each other.
+
+        Raises:
+            ValueError: describing the first offending keyframes.
+        """
+        bad = np.flatnonzero((self.lefts < 0) | (self.lefts >= self.rights))
+        if n_hooks is not None:
+            bad = np.union1d(bad, np.flatnonzero(self.rights > n_hooks))
+        if len(bad):
+            i = bad[0]
+            raise ValueError(
+                f"{len(bad)} loops out of range, e.g. LEF {self.lef_ids[i]} "
+                f"at t={self.times[i]}: ({self.lefts[i]}, {self.rights[i]})")
+
+        overlaps = self.find_overlaps(allow_nested=allow_nested)
+        if len(overlaps):
+            i, j = overlaps[0]
+            raise ValueError(
+                f"{len(overlaps)} overlapping loop pairs, e.g. "
+                f"LEF {self.lef_ids[i]} ({self.lefts[i]}, {self.rights[i]}) from t={self.times[i]} and "
+                f"LEF {self.lef_ids[j]} ({self.lefts[j]}, {self.rights[j]}) from t={self.times[j]}")
+
+
+def schedule_extrusion(final_loop_len, init_loop_idxs, time_span):
+    """
+    Schedule of a two-sided extrusion growing a loop from init_loop_idxs
+    to [0, final_loop_len), one hook per side per step.
+
+    Returns:
+        {time: (left, right)} dict with integer times spread over time_span
+    """
+    if init_loop_idxs is None:
+        init_loop_idxs = (final_loop_len // 2, final_loop_len // 2 + 1)
+
+    n_steps = max(init_loop_idxs[0], final_loop_len - init_loop_idxs[1]) + 1
+
+    ts = np.linspace(time_span[0], time_span[1], n_steps, dtype=int)
+
+    loop_traj = {}
+
+    for i in range(n_steps):
+        loop_traj[ts[i]] = (
+                max(0, init_loop_idxs[0] - i),
+                min(final_loop_len, init_loop_idxs[1] + i))
+
+    return loop_traj
+
+
+def loop_layout(
+        n_hooks,
+        step,
+        root_loc,
+        bridge_width,
+        stem_length=2,
+        arrange_root=True,
+        arrange_stem=True,
+        arrange_loop=False,
+        vertical_orientation=1):
+    """
+    Positions of the hooks of an extruded loop: two parallel stems of
+    stem_length hooks bridge_width apart, rising from root_loc along Y
+    (or -Y for vertical_orientation=-1), closed by a circle through the
+    remaining hooks.
+
+    Returns:
+        (n_hooks, 3) positions and a (n_hooks,) mask of the arranged hooks
+    """
+    root_loc = np.asarray(root_loc, dtype=np.float64)
+    vo = vertical_orientation
+    positions = np.zeros((n_hooks, 3))
+    mask = np.zeros(n_hooks, dtype=bool)
+
+    real_stem_length = min(stem_length, int(round(n_hooks / 2)))
+    i = np.arange(real_stem_length)
+    keep = np.ones(real_stem_length, dtype=bool)
+    if not arrange_root:
+        keep &= i != 0
+    if not arrange_stem:
+        keep &= i == 0
+    i = i[keep]
+    for side, idx in ((-1, i), (1, n_hooks - 1 - i)):
+        positions[idx] = root_loc
+        positions[idx, 0] += side * bridge_width / 2
+        positions[idx, 1] += i * step * vo
+        mask[idx] = True
+
+    if arrange_loop and n_hooks > 2 * stem_length and stem_length > 0:
+        n_hooks_circle = n_hooks - 2 * stem_length
+        l_circle = n_hooks_circle * step
+        r_circle = l_circle / np.pi / 2
+
+        stem_angle = np.arcsin(bridge_width / 2 / r_circle)
+        loop_total_angle = 2 * np.pi - stem_angle * 2
+        angle_per_hook = loop_total_angle / (n_hooks_circle + 1)
+
+        center_circle = root_loc + np.array([0, (step * (stem_length - 1) + r_circle) * vo, 0])
+
+        hook_angle = 1.5 * np.pi - angle_per_hook * np.arange(1, n_hooks_circle + 1) - stem_angle
+        idx = np.arange(stem_length, n_hooks - stem_length)
+        positions[idx] = center_circle
+        positions[idx, 0] += r_circle * np.cos(hook_angle)
+        positions[idx, 1] += r_circle * np.sin(hook_angle) * vo
+        mask[idx] = True
+
+    return positions, mask
@@ -1,9 +1,279 @@
 import numpy as np
 
 import bpy
+import bmesh
 
 
-def merge_meshes(objects, operation='UNION', result_name=None, keep_originals=True, solver='FAST', remove_doubles_threshold=0):
+def _connected_components(n, u, v):
+    """Component labels of n nodes from (E,) edges u-v, by hooking and pointer jumping."""
+    labels = np.arange(n)
+    while True:
+        lu, lv = labels[u], labels[v]
+        differ = lu != lv
+        if not differ.any():
+            break
+        lo = np.minimum(lu[differ], lv[differ])
+        hi = np.maximum(lu[differ], lv[differ])
+        # hook the root of the larger label under the smaller one
+        np.minimum.at(labels, hi, lo)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def overlap_groups(bbox_min, bbox_max, margin=0.0, max_pairs=2**22):
+    """
+    Group boxes into connected components of overlapping boxes, with a
+    sweep over the boxes sorted along x and a union of the overlapping pairs.
+
+    Args:
+        bbox_min, bbox_max: (N, 3) corners of axis-aligned bounding boxes
+        margin: boxes closer than this are considered overlapping
+        max_pairs: number of candidate pairs checked at once, bounds memory
+
+    Returns:
+        (N,) component label of every box
+    """
+    bbox_min = np.asarray(bbox_min, dtype=np.float64).reshape(-1, 3) - margin / 2
+    bbox_max = np.asarray(bbox_max, dtype=np.float64).reshape(-1, 3) + margin / 2
+    n = len(bbox_min)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # candidates of box i: the boxes sorted after it that start before it ends along x
+    order = np.argsort(bbox_min[:, 0], kind='stable')
+    x_min = bbox_min[order, 0]
+    ends = np.searchsorted(x_min, bbox_max[order, 0], side='right')
+    counts = np.maximum(ends - np.arange(n) - 1, 0)
+
+    # pairs are checked in chunks of boxes with a bounded number of candidates
+    cum = np.cumsum(counts)
+    bounds = np.searchsorted(cum, np.arange(0, cum[-1], max_pairs), side='right')
+    bounds = np.unique(np.concatenate([[0], bounds, [n]]))
+    edges_u, edges_v = [], []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        c = counts[lo:hi]
+        first = np.repeat(np.arange(lo, hi), c)
+        second = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c) + first + 1
+        u, v = order[first], order[second]
+        overlap = np.all((bbox_min[u, 1:] <= bbox_max[v, 1:])
+                         & (bbox_min[v, 1:] <= bbox_max[u, 1:]), axis=1)
+        edges_u.append(u[overlap])
+        edges_v.append(v[overlap])
+    return _connected_components(n, np.concatenate(edges_u), np.concatenate(edges_v))
+
+
+def _world_bboxes(objects):
+    bbox_min, bbox_max = [], []
+    for obj in objects:
+        corners = np.array(obj.bound_box)
+        m = np.array(obj.matrix_world)
+        corners = corners @ m[:3, :3].T + m[:3, 3]
+        bbox_min.append(corners.min(axis=0))
+        bbox_max.append(corners.max(axis=0))
+    return np.array(bbox_min), np.array(bbox_max)
+
+
+def join_meshes(objects, name='joined', collection=None):
+    """
+    Join mesh objects into a single mesh object without booleans, through the
+    data API: vertices are transformed to world coordinates, faces are kept,
+    and so are the materials and the UV maps (by name; loops of meshes
+    without a UV map get (0, 0) in it). Other attributes are not carried over.
+
+    Returns:
+        The new joined object
+    """
+    objects = list(objects)
+    materials = []
+    for obj in objects:
+        for mat in obj.data.materials:
+            if mat not in materials:
+                materials.append(mat)
+    uv_names = []
+    for obj in objects:
+        for uv_layer in obj.data.uv_layers:
+            if uv_layer.name not in uv_names:
+                uv_names.append(uv_layer.name)
+
+    cos, vertex_indices, loop_totals, smooth = [], [], [], []
+    material_indices = []
+    uvs = {uv_name: [] for uv_name in uv_names}
+    offset = 0
+    for obj in objects:
+        me = obj.data
+        co = np.empty(3 * len(me.vertices), dtype=np.float64)
+        me.vertices.foreach_get('co', co)
+        m = np.array(obj.matrix_world)
+        cos.append(co.reshape(-1, 3) @ m[:3, :3].T + m[:3, 3])
+
+        vi = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get('vertex_index', vi)
+        vertex_indices.append(vi + offset)
+
+        lt = np.empty(len(me.polygons), dtype=np.int32)
+        me.polygons.foreach_get('loop_total', lt)
+        loop_totals.append(lt)
+
+        sm = np.empty(len(me.polygons), dtype=bool)
+        me.polygons.foreach_get('use_smooth', sm)
+        smooth.append(sm)
+
+        mi = np.empty(len(me.polygons), dtype=np.int32)
+        me.polygons.foreach_get('material_index', mi)
+        # slot index of the mesh -> slot index of the joined mesh
+        slot_map = np.array([materials.index(mat) for mat in me.materials] or [0], dtype=np.int32)
+        material_indices.append(slot_map[np.clip(mi, 0, len(slot_map) - 1)])
+
+        for uv_name in uv_names:
+            uv_layer = me.uv_layers.get(uv_name)
+            uv = np.zeros(2 * len(me.loops), dtype=np.float32)
+            if uv_layer is not None:
+                uv_layer.data.foreach_get('uv', uv)
+            uvs[uv_name].append(uv)
+
+        offset += len(me.vertices)
+
+    cos = np.concatenate(cos)
+    vertex_indices = np.concatenate(vertex_indices)
+    loop_totals = np.concatenate(loop_totals)
+    loop_starts = np.concatenate([[0], np.cumsum(loop_totals)[:-1]]).astype(np.int32)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(cos))
+    mesh.vertices.foreach_set('co', cos.astype(np.float32).ravel())
+    mesh.loops.add(len(vertex_indices))
+    mesh.loops.foreach_set('vertex_index', vertex_indices)
+    mesh.polygons.add(len(loop_totals))
+    mesh.polygons.foreach_set('loop_start', loop_starts)
+    # face sizes follow from the loop starts since Blender 4.0, where loop_total is read-only
+    if not bpy.types.MeshPolygon.bl_rna.properties['loop_total'].is_readonly:
+        mesh.polygons.foreach_set('loop_total', loop_totals)
+    mesh.polygons.foreach_set('use_smooth', np.concatenate(smooth))
+    for mat in materials:
+        mesh.materials.append(mat)
+    mesh.polygons.foreach_set('material_index', np.concatenate(material_indices))
+    for uv_name in uv_names:
+        mesh.uv_layers.new(name=uv_name).data.foreach_set('uv', np.concatenate(uvs[uv_name]))
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    obj = bpy.data.objects.new(name, mesh)
+    (collection or bpy.context.collection).objects.link(obj)
+    return obj
+
+
+def weld_vertices(obj, threshold):
+    """Merge vertices closer than threshold, without entering EDIT mode."""
+    bm = bmesh.new()
+    bm.from_mesh(obj.data)
+    bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=threshold)
+    bm.to_mesh(obj.data)
+    bm.free()
+    obj.data.update()
+
+
+def _add_boolean(obj, other, operation, solver):
+    bool_mod = obj.modifiers.new(name="Boolean", type='BOOLEAN')
+    bool_mod.operation = operation
+    bool_mod.object = other
+    bool_mod.solver = solver
+    bool_mod.use_hole_tolerant = True
+    bool_mod.use_self = True
+    return bool_mod
+
+
+def _apply_modifiers_data(objs):
+    # one depsgraph evaluation for all objects, which Blender evaluates in parallel
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for obj in objs:
+        mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+        obj.modifiers.clear()
+        old_mesh = obj.data
+        obj.data = mesh
+        if old_mesh.users == 0:
+            bpy.data.meshes.remove(old_mesh)
+
+
+def _remove_obj_and_mesh(obj):
+    mesh = obj.data
+    bpy.data.objects.remove(obj)
+    if mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+
+
+def _tree_boolean(objs, operation, solver):
+    """Combine objects in a balanced pairwise tree, one depsgraph evaluation per level."""
+    while len(objs) > 1:
+        pairs = list(zip(objs[0::2], objs[1::2]))
+        for a, b in pairs:
+            _add_boolean(a, b, operation, solver)
+        _apply_modifiers_data([a for a, _ in pairs])
+        for _, b in pairs:
+            _remove_obj_and_mesh(b)
+        objs = [a for a, _ in pairs] + (objs[-1:] if len(objs) % 2 else [])
+    return objs[0]
+
+
+def _merge_meshes_tree(objects, operation, solver, cluster, cluster_margin, result_name):
+    work_collection = bpy.data.collections.new('merge_meshes_tmp')
+    bpy.context.scene.collection.children.link(work_collection)
+
+    copies = []
+    for obj in objects:
+        if obj.type != 'MESH':
+            raise ValueError(f"Object {obj.name} is not a mesh")
+        copy = obj.copy()
+        copy.data = obj.data.copy()
+        work_collection.objects.link(copy)
+        copies.append(copy)
+
+    if operation == 'DIFFERENCE':
+        # A - B - C - ... == A - (B | C | ...)
+        base = copies[0]
+        if len(copies) > 1:
+            cutter = _tree_boolean(copies[1:], 'UNION', solver)
+            _add_boolean(base, cutter, 'DIFFERENCE', solver)
+            _apply_modifiers_data([base])
+            _remove_obj_and_mesh(cutter)
+        result = base
+
+    elif operation == 'UNION' and cluster:
+        # disjoint groups of overlapping objects only need to be joined
+        labels = overlap_groups(*_world_bboxes(copies), margin=cluster_margin)
+        groups = [[c for c, l in zip(copies, labels) if l == label]
+                  for label in range(labels.max() + 1)]
+        group_results = [_tree_boolean(group, 'UNION', solver) for group in groups]
+        if len(group_results) > 1:
+            result = join_meshes(group_results, name=result_name, collection=work_collection)
+            for obj in group_results:
+                _remove_obj_and_mesh(obj)
+        else:
+            result = group_results[0]
+
+    else:
+        result = _tree_boolean(copies, operation, solver)
+
+    bpy.context.collection.objects.link(result)
+    work_collection.objects.unlink(result)
+    bpy.data.collections.remove(work_collection)
+    result.name = result_name
+    return result
+
+
+def merge_meshes(
+        objects, 
+        operation='UNION', 
+        result_name=None, 
+        keep_originals=True, 
+        solver='FAST', 
+        remove_doubles_threshold=0,
+        strategy='sequential',
+        cluster=False,
+        cluster_margin=0.0):
     """
     Merges multiple mesh objects using boolean operations.
     
@@ -12,38 +282,48 @@ def merge_meshes(objects, operation='UNION', result_name=None, keep_originals=Tr
         operation: Boolean operation type ('UNION', 'DIFFERENCE', 'INTERSECT')
         result_name: Name for the resulting merged object
         keep_originals: Whether to keep the original objects
+        strategy: 'sequential' - apply one boolean per object onto a growing
+            base mesh; 'tree' - combine objects in a balanced pairwise tree,
+            evaluating all booleans of a tree level at once
+        cluster: with strategy='tree' and operation='UNION', only union
+            objects with overlapping bounding boxes and join the disjoint
+            groups without booleans
+        cluster_margin: bounding boxes closer than this are grouped together
         
     Returns:
         The new merged object
     """
     if not objects or len(objects) < 2:
         raise ValueError("At least two objects must be provided to merge")
-    
-    # Make a copy of the first object as our base
-    base_obj = objects[0].copy()
-    base_obj.data = objects[0].data.copy()
-    if result_name:
+
+    result_name = result_name or f"{objects[0].name}_merged"
+
+    if strategy == 'tree':
+        base_obj = _merge_meshes_tree(
+            objects, operation, solver, cluster, cluster_margin, result_name)
+
+    elif strategy == 'sequential':
+        # Make a copy of the first object as our base
+        base_obj = objects[0].copy()
+        base_obj.data = objects[0].data.copy()
         base_obj.name = result_name
+        bpy.context.collection.objects.link(base_obj)
+        
+        # Apply boolean modifiers for each additional object
+        for i, obj in enumerate(objects[1:]):
+            if obj.type != 'MESH':
+                raise ValueError(f"Object {obj.name} is not a mesh")
+                
+            # Create boolean modifier
+            bool_mod = _add_boolean(base_obj, obj, operation, solver)
+            bool_mod.name = f"Boolean_{i}"
+
+            # Apply the modifier
+            bpy.context.view_layer.objects.active = base_obj
+            bpy.ops.object.modifier_apply(modifier=bool_mod.name)
+
     else:
-        base_obj.name = f"{objects[0].name}_merged"
-    bpy.context.collection.objects.link(base_obj)
-    
-    # Apply boolean modifiers for each additional object
-    for i, obj in enumerate(objects[1:]):
-        if obj.type != 'MESH':
-            raise ValueError(f"Object {obj.name} is not a mesh")
-            
-        # Create boolean modifier
-        bool_mod = base_obj.modifiers.new(name=f"Boolean_{i}", type='BOOLEAN')
-        bool_mod.operation = operation
-        bool_mod.object = obj
-        bool_mod.solver = solver
-        bool_mod.use_hole_tolerant = True
-        bool_mod.use_self = True
-
-        # Apply the modifier
-        bpy.context.view_layer.objects.active = base_obj
-        bpy.ops.object.modifier_apply(modifier=bool_mod.name)
+        raise ValueError("strategy must be 'sequential' or 'tree'")
     
     # Remove original objects if not keeping them
     if not keep_originals:
@@ -52,13 +332,8 @@ def merge_meshes(objects, operation='UNION', result_name=None, keep_originals=Tr
                 bpy.data.objects.remove(obj)
     
     # Optional: Remove duplicate vertices
-    bpy.context.view_layer.objects.active = base_obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='SELECT')
     if remove_doubles_threshold > 0:
-        bpy.ops.mesh.remove_doubles(threshold=remove_doubles_threshold)
-
-    bpy.ops.object.mode_set(mode='OBJECT')
+        weld_vertices(base_obj, remove_doubles_threshold)
     
     return base_obj
 
@@ -6,6 +6,27 @@ from mathutils import Vector
 from bpy_extras.object_utils import object_data_add
 
 from .geoutils import alignment_quaternion
+from .isosurface import bead_isosurface
+from .interpolate import interpolate_frames
+from .spatial import GridIndex, contacts
+from .utils import bulk_edit
+
+
+def get_collection(collection=None):
+    """
+    Resolve a collection given by name, creating it under the scene collection
+    if it does not exist yet; None or "" is the active collection.
+    """
+    if not collection:
+        return bpy.context.collection
+    if isinstance(collection, bpy.types.Collection):
+        return collection
+    if collection not in bpy.data.collections:
+        new_collection = bpy.data.collections.new(collection)
+        bpy.context.scene.collection.children.link(new_collection)
+        return new_collection
+    return bpy.data.collections[collection]
+
 
 def add_curve(
         coords, 
@@ -70,6 +91,7 @@ def add_curve(
     return curveData, curveOB
 
 
+@bulk_edit()
 def smooth_bezier_curve(curve_obj):
     bpy.ops.object.select_all(action='DESELECT')
     curve_obj.select_set(True)
@@ -119,7 +141,19 @@ def create_animated_curve(
     thickness = 0.2,
     name='polymer', 
     resolution=4,
-    kind='BEZIER'):
+    kind='BEZIER',
+    out_ts=None,
+    interpolation='linear'):
+    """
+    Keyframe a curve through the frames ds at times ts. If out_ts is given,
+    the trajectory is first resampled at out_ts with `interpolation`
+    ('linear', 'cubic' or 'catmull_rom'), e.g. to bake smooth motion
+    between sparse simulation snapshots.
+    """
+    ts = ts if hasattr(ts, "__iter__") else np.arange(len(ds)) * ts
+    if out_ts is not None:
+        ds = interpolate_frames(ds, times=ts, out_times=out_ts, method=interpolation)
+        ts = out_ts
 
     curve, obj = add_curve(
         ds[0],
@@ -130,8 +164,6 @@ def create_animated_curve(
 
     name = curve.name
 
-    ts = ts if hasattr(ts, "__iter__") else np.arange(len(ds)) * ts
-
     for d, t in zip(ds,ts):
         add_keyframe_curve(name, d, t)
 
@@ -213,6 +245,7 @@ def add_cylinder(
     return cylinder
 
 
+@bulk_edit()
 def add_spheres(positions, radius=0.015, names='sphere_{}' , collection=""):
     """
     Creates spheres at given positions with the specified radius and adds them to a new collection.
@@ -251,15 +284,121 @@ def add_spheres(positions, radius=0.015, names='sphere_{}' , collection=""):
         sphere.name = naming_func(i)
         sphere.data.shade_smooth()
 
-        # Link the sphere to the new collection and unlink from the default collection
-        new_collection.objects.link(sphere)
-        bpy.context.collection.objects.unlink(sphere)
+        # Move the sphere from the active collection, where the operator put it
+        if new_collection != bpy.context.collection:
+            new_collection.objects.link(sphere)
+            bpy.context.collection.objects.unlink(sphere)
 
     return new_collection
 
 
 
 
+def add_mesh(verts, faces, name='mesh', collection=None, smooth=True):
+    """
+    Create a mesh object from (V, 3) vertices and (F, 3) or (F, 4) faces,
+    written in bulk with foreach_set. collection is a collection or its name.
+    """
+    verts = np.asarray(verts, dtype=np.float32).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int32)
+    n_faces, n_corners = faces.shape if faces.size else (0, 3)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set('co', verts.ravel())
+    mesh.loops.add(n_faces * n_corners)
+    mesh.loops.foreach_set('vertex_index', faces.ravel())
+    mesh.polygons.add(n_faces)
+    mesh.polygons.foreach_set('loop_start', np.arange(0, n_faces * n_corners, n_corners, dtype=np.int32))
+    # face sizes follow from the loop starts since Blender 4.0, where loop_total is read-only
+    if not bpy.types.MeshPolygon.bl_rna.properties['loop_total'].is_readonly:
+        mesh.polygons.foreach_set('loop_total', np.full(n_faces, n_corners, dtype=np.int32))
+    mesh.polygons.foreach_set('use_smooth', np.full(n_faces, smooth, dtype=bool))
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    obj = bpy.data.objects.new(name, mesh)
+    get_collection(collection).objects.link(obj)
+    return obj
+
+
+def add_bonds(coords, pairs, name='bonds', collection=None):
+    """
+    Create one mesh object with an edge between the beads of every pair,
+    written in bulk with foreach_set; give it thickness with a skin or
+    wireframe modifier, or render the edges with geometry nodes.
+
+    Args:
+        coords: (N, 3) bead coordinates
+        pairs: (i, j) index arrays or an (M, 2) array of bonded beads
+        collection: a collection or its name
+    """
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+    if isinstance(pairs, tuple):
+        pairs = np.stack(pairs, axis=1)
+    pairs = np.asarray(pairs).reshape(-1, 2)
+
+    # keep only the bonded beads as vertices
+    used, edges = np.unique(pairs.ravel(), return_inverse=True)
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(used))
+    mesh.vertices.foreach_set('co', coords[used].ravel())
+    mesh.edges.add(len(pairs))
+    mesh.edges.foreach_set('vertices', edges.astype(np.int32).ravel())
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    get_collection(collection).objects.link(obj)
+    return obj
+
+
+def add_contacts(coords, r, min_separation=2, cell_size=None, name='contacts', collection=None):
+    """
+    Draw the contacts of a conformation, i.e. bonds between all beads closer
+    than r, found with a grid index instead of comparing all pairs.
+    Pairs less than min_separation apart along the chain are skipped.
+
+    Returns:
+        the bond object, or None if there are no contacts
+    """
+    i, j = contacts(coords, r, cell_size=cell_size, min_separation=min_separation)
+    if len(i) == 0:
+        return None
+    return add_bonds(coords, (i, j), name=name, collection=collection)
+
+
+def add_proximity_markers(coords, centers, r, radius=0.015, names='marker_{}', collection='proximity_markers'):
+    """
+    Put spheres on the beads closer than r to any of the centers, e.g. to
+    mark the chromatin around a loop extruder.
+
+    Returns:
+        the indices of the marked beads and the collection of the spheres
+    """
+    coords = np.asarray(coords).reshape(-1, 3)
+    near = np.flatnonzero(GridIndex(coords, r).within(centers, r))
+    return near, add_spheres(coords[near], radius=radius, names=names, collection=collection)
+
+
+def add_isosurface(
+        coords,
+        radii,
+        voxel_size,
+        blob=2.0,
+        method='surface_nets',
+        max_memory=2**28,
+        name='territory',
+        collection=None):
+    """
+    Create a smooth surface enclosing beads directly from their coordinates,
+    e.g. a chromosome territory, instead of merging and remeshing spheres.
+    See polender.isosurface.bead_isosurface for the parameters.
+    """
+    verts, faces = bead_isosurface(
+        coords, radii, voxel_size, blob=blob, method=method, max_memory=max_memory)
+    return add_mesh(verts, faces, name=name, collection=collection)
+
+
 def add_backdrop(s=100, 
                  name='Backdrop', 
                  bevel_width_frac=0.15, 
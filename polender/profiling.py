@@ -0,0 +1,299 @@
+import os
+import sys
+import dis
+import json
+import time
+import functools
+
+import bpy
+
+
+_OPS_FILE = os.path.join('bpy', 'ops.py')
+
+# RNA methods behind most of the hidden costs, e.g. for rna_methods=HOT_RNA_METHODS
+HOT_RNA_METHODS = (
+    'keyframe_insert', 'keyframe_delete', 'foreach_get', 'foreach_set',
+    'frame_set', 'evaluated_depsgraph_get', 'update', 'new', 'link', 'add')
+
+_CALL_OPS = ('CALL', 'CALL_KW', 'CALL_FUNCTION_EX')
+_ATTR_OPS = ('LOAD_ATTR', 'LOAD_METHOD')
+
+
+@functools.lru_cache(maxsize=None)
+def _rna_function_names():
+    names = set()
+    for type_name in dir(bpy.types):
+        bl_rna = getattr(getattr(bpy.types, type_name, None), 'bl_rna', None)
+        if bl_rna is not None:
+            names.update(bl_rna.functions.keys())
+    return frozenset(names)
+
+
+@functools.lru_cache(maxsize=None)
+def _call_names(code):
+    """
+    Byte offset of every call instruction of code -> name of the attribute
+    it calls, e.g. 'frame_set' for scene.frame_set(t). The callee is the
+    longest attribute load starting where the call expression starts; needs
+    the instruction positions of Python 3.11+, empty otherwise.
+    """
+    names = {}
+    attrs = []
+    for ins in dis.get_instructions(code):
+        pos = getattr(ins, 'positions', None)
+        if pos is None or pos.lineno is None or pos.col_offset is None:
+            continue
+        start, end = (pos.lineno, pos.col_offset), (pos.end_lineno, pos.end_col_offset)
+        if ins.opname in _ATTR_OPS:
+            attrs.append((start, end, ins.argval))
+        elif ins.opname in _CALL_OPS:
+            callee = max((a for a in attrs if a[0] == start and a[1] < end),
+                         key=lambda a: a[1], default=None)
+            if callee is not None:
+                names[ins.offset] = callee[2]
+    return names
+
+
+class CallNode:
+    """A node of the call tree: a polender function, an operator or an RNA call."""
+
+    def __init__(self, name, kind='function'):
+        self.name = name
+        self.kind = kind
+        self.count = 0
+        self.time = 0.0
+        self.children = {}
+
+    def child(self, name, kind):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = CallNode(name, kind)
+        return node
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'count': self.count,
+            'time': self.time,
+            'children': [c.to_dict() for c in
+                         sorted(self.children.values(), key=lambda c: -c.time)],
+        }
+
+
+class Profiler:
+    """
+    Opt-in profiler of the hidden costs of a scene build: counts and times
+    operator calls (bpy.ops.*) and RNA method calls (keyframe_insert,
+    foreach_set, scene.frame_set, objects.new, collection.objects.link, ...),
+    attributed to the polender functions they were made from, as a call tree.
+
+    Operators, polender functions and builtin RNA methods (foreach_set,
+    keyframe_insert, ...) are seen by a profile hook. RNA functions such as
+    frame_set or objects.new are neither Python nor builtin functions and
+    raise no profile event, so the call instructions of polender's own code
+    are traced as well, and a call to an attribute named like an RNA
+    function that runs no Python or builtin function of that name is
+    counted as one (Python 3.11+). Tracing slows execution down, so absolute
+    times are inflated; the counts and the relative times are what matter.
+
+    Example:
+        with polender.profiling.profile() as prof:
+            ae.make_hooked_chain(200, 8)
+        prof.print_report()
+    """
+
+    def __init__(self, packages=('polender',), rna_methods=None):
+        self.packages = tuple(packages)
+        # None: all RNA methods
+        self.rna_methods = None if rna_methods is None else set(rna_methods)
+        self.root = CallNode('<root>', 'root')
+        self._rna_types = (bpy.types.bpy_struct, bpy.types.bpy_prop_collection)
+        self._stack = []
+        self._previous = None
+        self._previous_trace = None
+        self._rna_names = frozenset()
+        # frame -> (stack key, name) of its RNA function call in progress
+        self._open_calls = {}
+
+    def _is_tracked_module(self, frame):
+        module = frame.f_globals.get('__name__', '')
+        if module == __name__:
+            return False
+        return any(module == p or module.startswith(p + '.') for p in self.packages)
+
+    def _push(self, name, kind, key):
+        parent = self._stack[-1][0] if self._stack else self.root
+        node = parent.child(name, kind)
+        node.count += 1
+        self._stack.append((node, key, time.perf_counter()))
+
+    def _pop(self, key):
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][1] is key:
+                break
+        else:
+            return
+        now = time.perf_counter()
+        # also close calls left open above it, e.g. by an exception
+        while len(self._stack) > i:
+            node, _, t0 = self._stack.pop()
+            node.time += now - t0
+
+    def _close_call(self, frame):
+        call = self._open_calls.pop(frame, None)
+        if call is not None:
+            self._pop(call[0])
+
+    def _discard_call(self, frame, name):
+        # the call of `frame` turned out to be a Python or builtin function
+        call = self._open_calls.get(frame)
+        if call is None or call[1] != name:
+            return
+        del self._open_calls[frame]
+        if self._stack and self._stack[-1][1] is call[0]:
+            node = self._stack.pop()[0]
+            node.count -= 1
+            parent = self._stack[-1][0] if self._stack else self.root
+            if node.count == 0 and not node.children:
+                del parent.children[node.name]
+
+    def _trace(self, frame, event, arg):
+        # global trace function: trace the instructions of polender's frames
+        if self._is_tracked_module(frame) and _call_names(frame.f_code):
+            frame.f_trace_opcodes = True
+            return self._trace_calls
+        return None
+
+    def _trace_calls(self, frame, event, arg):
+        if event == 'opcode':
+            # an RNA function call ends with the next instruction of its caller
+            self._close_call(frame)
+            name = _call_names(frame.f_code).get(frame.f_lasti)
+            if name is not None and name in self._rna_names and (
+                    self.rna_methods is None or name in self.rna_methods):
+                key = object()
+                self._push(name, 'rna', key)
+                self._open_calls[frame] = (key, name)
+        elif event in ('return', 'exception'):
+            self._close_call(frame)
+        return self._trace_calls
+
+    def _profile(self, frame, event, arg):
+        if event == 'call':
+            code = frame.f_code
+            if self._open_calls and frame.f_back is not None:
+                self._discard_call(frame.f_back, code.co_name)
+            if code.co_name == '__call__' and code.co_filename.endswith(_OPS_FILE):
+                op = frame.f_locals.get('self')
+                self._push(
+                    f'bpy.ops.{getattr(op, "_module", "?")}.{getattr(op, "_func", "?")}',
+                    'operator', frame)
+            elif self._is_tracked_module(frame):
+                name = getattr(code, 'co_qualname', code.co_name)
+                self._push(f'{frame.f_globals["__name__"]}.{name}', 'function', frame)
+        elif event == 'return':
+            self._pop(frame)
+        elif event == 'c_call':
+            if self._open_calls:
+                self._discard_call(frame, getattr(arg, '__name__', None))
+            owner = getattr(arg, '__self__', None)
+            if isinstance(owner, self._rna_types) and (
+                    self.rna_methods is None or arg.__name__ in self.rna_methods):
+                self._push(arg.__name__, 'rna', arg)
+        elif event in ('c_return', 'c_exception'):
+            self._pop(arg)
+
+    def start(self):
+        self._rna_names = _rna_function_names()
+        self._previous = sys.getprofile()
+        self._previous_trace = sys.gettrace()
+        sys.setprofile(self._profile)
+        sys.settrace(self._trace)
+        return self
+
+    def stop(self):
+        sys.settrace(self._previous_trace)
+        sys.setprofile(self._previous)
+        self._open_calls = {}
+        # close calls still open, e.g. the function that called stop()
+        now = time.perf_counter()
+        for node, _, t0 in self._stack:
+            node.time += now - t0
+        self._stack = []
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def summary(self, kinds=('operator', 'rna')):
+        """Flat {name: (count, time)} of the calls of the given kinds over the whole tree."""
+        out = {}
+
+        def visit(node):
+            if node.kind in kinds:
+                count, t = out.get(node.name, (0, 0.0))
+                out[node.name] = (count + node.count, t + node.time)
+            for child in node.children.values():
+                visit(child)
+
+        visit(self.root)
+        return dict(sorted(out.items(), key=lambda x: -x[1][1]))
+
+    def report(self, min_time=0.0, max_depth=None):
+        """The call tree as text, children sorted by total time."""
+        lines = [f'{"call":60s} {"count":>10s} {"time, s":>10s}']
+
+        def visit(node, depth):
+            for child in sorted(node.children.values(), key=lambda c: -c.time):
+                if child.time < min_time:
+                    continue
+                name = '  ' * depth + child.name
+                lines.append(f'{name:60s} {child.count:10d} {child.time:10.3f}')
+                if max_depth is None or depth + 1 < max_depth:
+                    visit(child, depth + 1)
+
+        visit(self.root, 0)
+        return '\n'.join(lines)
+
+    def print_report(self, min_time=0.0, max_depth=None):
+        print(self.report(min_time=min_time, max_depth=max_depth))
+
+    def to_dict(self):
+        return {
+            'tree': self.root.to_dict()['children'],
+            'summary': {k: {'count': c, 'time': t} for k, (c, t) in self.summary().items()},
+        }
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def profile(packages=('polender',), rna_methods=None):
+    """Context manager profiling the block, see Profiler."""
+    return Profiler(packages=packages, rna_methods=rna_methods)
+
+
+def profiled(fn=None, report=True, min_time=0.0):
+    """
+    Decorator profiling every call of a function, e.g. a scene build;
+    the Profiler of the last call is kept as `fn.profiler`.
+    """
+    if fn is None:
+        return functools.partial(profiled, report=report, min_time=min_time)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with Profiler() as prof:
+            result = fn(*args, **kwargs)
+        wrapper.profiler = prof
+        if report:
+            prof.print_report(min_time=min_time)
+        return result
+
+    wrapper.profiler = None
+    return wrapper
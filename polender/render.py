@@ -0,0 +1,319 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+
+
+_SAVED_RE = re.compile(r"Saved: '(.+)'")
+
+
+def _abspath(path, blend_path=None):
+    # Blender paths starting with // are relative to the .blend file
+    if path.startswith('//'):
+        if blend_path is not None:
+            return os.path.join(os.path.dirname(os.path.abspath(blend_path)), path[2:])
+        try:
+            import bpy
+            return bpy.path.abspath(path)
+        except ImportError:
+            return path[2:]
+    return os.path.abspath(path)
+
+
+def frame_path(output, frame, extension='.png'):
+    """
+    Output path of a frame, following Blender's rules: the last run of '#'
+    is replaced by the zero-padded frame number, or 4 digits are appended.
+    output must be an absolute path.
+    """
+    runs = list(re.finditer(r'#+', output))
+    if runs:
+        run = runs[-1]
+        path = output[:run.start()] + str(frame).zfill(len(run.group())) + output[run.end():]
+    else:
+        path = output + str(frame).zfill(4)
+    if extension and not path.endswith(extension):
+        path += extension
+    return path
+
+
+def split_frames(frames, chunk_size):
+    """Split a list of frames into chunks of consecutive items."""
+    frames = list(frames)
+    return [frames[i:i + chunk_size] for i in range(0, len(frames), chunk_size)]
+
+
+def _frames_arg(frames):
+    # Blender's -f accepts comma-separated frames and inclusive 'a..b' ranges
+    parts = []
+    start = prev = frames[0]
+    for f in list(frames[1:]) + [None]:
+        if f is not None and f == prev + 1:
+            prev = f
+            continue
+        parts.append(str(start) if start == prev else f'{start}..{prev}')
+        start = prev = f
+    return ','.join(parts)
+
+
+def _is_rendered(path):
+    return os.path.isfile(path) and os.path.getsize(path) > 0
+
+
+def _partial_output(output):
+    # frames are written under a temporary name and renamed once saved, so
+    # that a frame interrupted mid-write is not taken as rendered on resume
+    head, tail = os.path.split(output)
+    return os.path.join(head, '.partial_' + tail)
+
+
+def _active_streams():
+    # without importing polender.streaming, which needs bpy
+    streaming = sys.modules.get(__package__ + '.streaming')
+    return streaming.get_streams() if streaming is not None else {}
+
+
+def _run_shard(cmd, shard, frames, paths, partial_paths, log):
+    """Run one Blender process, moving and timing the frames as they are saved."""
+    path_to_frame = {os.path.normcase(p): f for f, p in zip(frames, partial_paths)}
+    final_paths = dict(zip(frames, paths))
+    timings = []
+    t_start = t_last = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, errors='replace')
+    try:
+        for line in proc.stdout:
+            if log is not None:
+                log.write(line)
+            m = _SAVED_RE.search(line)
+            if m is None:
+                continue
+            now = time.perf_counter()
+            frame = path_to_frame.get(os.path.normcase(os.path.abspath(m.group(1))))
+            path = m.group(1)
+            if frame is not None:
+                path = final_paths[frame]
+                os.replace(m.group(1), path)
+            timings.append({
+                'frame': frame,
+                'path': path,
+                'seconds': now - t_last,
+                'shard': shard,
+            })
+            t_last = now
+        proc.wait()
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+
+    return {
+        'shard': shard,
+        'frames': list(frames),
+        'returncode': proc.returncode,
+        'seconds': time.perf_counter() - t_start,
+        # the first frame of a shard includes Blender's startup and scene loading
+        'timings': timings,
+    }
+
+
+def render_parallel(
+        blend_path=None,
+        frames=None,
+        output=None,
+        n_workers=None,
+        threads_per_worker=None,
+        chunk_size=None,
+        extension=None,
+        overwrite=False,
+        blender=None,
+        engine=None,
+        extra_args=(),
+        setup_script=None,
+        log_dir=None,
+        report_path=None,
+        verbose=True):
+    """
+    Render a frame range with several headless Blender processes in parallel.
+
+    The frames still missing on disk are split into shards of consecutive
+    frames, which are dispatched to n_workers `blender -b` processes, each
+    limited to threads_per_worker threads. Frames already rendered are
+    skipped, so an interrupted render resumes where it stopped.
+
+    Called from a Blender session, the current scene is saved to a
+    temporary .blend file (unless blend_path is given) and the frame range,
+    output path and file extension default to the scene's render settings.
+
+    Streamed trajectories (polender.streaming) live in frame_change_pre
+    handlers of the running session, not in the .blend file; pass a
+    setup_script that re-creates them, it is run by every worker after
+    loading the file. Rendering with active streams and no setup_script
+    raises a ValueError, since the streamed objects would render frozen.
+
+    Args:
+        blend_path: .blend file to render
+        frames: frames to render, the scene frame range by default
+        output: output path as for `blender -o`, e.g. '//render/frame_####'
+        n_workers: number of Blender processes, cpu_count / 4 by default
+        threads_per_worker: render threads per process,
+            cpu_count / n_workers by default
+        chunk_size: frames per shard; small shards balance the load,
+            large ones amortize Blender's startup
+        extension: file extension of the rendered frames, e.g. '.png'
+        overwrite: render frames that already exist on disk
+        blender: Blender executable, the running one or 'blender' by default
+        engine: render engine override, e.g. 'CYCLES'
+        extra_args: extra command line arguments, placed before -f
+        setup_script: Python script run by every worker before rendering,
+            e.g. to restart streaming playback
+        log_dir: directory for the stdout of every shard
+        report_path: write the report as JSON to this path
+        verbose: print progress
+
+    Returns:
+        report dict with the rendered, skipped and failed frames, per-frame
+        timings and the wall time
+    """
+    try:
+        import bpy
+    except ImportError:
+        bpy = None
+
+    if setup_script is None and _active_streams():
+        raise ValueError(
+            "streamed objects would render frozen in the worker processes; "
+            "pass a setup_script that restarts streaming, e.g. the script building the scene")
+
+    if output is None and bpy is not None:
+        output = bpy.context.scene.render.filepath
+    if output is not None:
+        # resolve // before the scene is copied to a temporary directory
+        output = _abspath(output, None if bpy is not None else blend_path)
+
+    tmp_dir = None
+    if blend_path is None:
+        if bpy is None:
+            raise ValueError("blend_path is required outside of Blender")
+        tmp_dir = tempfile.mkdtemp(prefix='polender_render_')
+        blend_path = os.path.join(tmp_dir, 'scene.blend')
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+    if bpy is not None:
+        scene = bpy.context.scene
+        if frames is None:
+            frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+        if extension is None:
+            extension = (scene.render.file_extension
+                         if scene.render.use_file_extension else '')
+        if blender is None:
+            blender = bpy.app.binary_path
+    if frames is None or output is None:
+        raise ValueError("frames and output are required outside of Blender")
+    extension = '.png' if extension is None else extension
+    blender = blender or shutil.which('blender') or 'blender'
+
+    frames = sorted(set(int(f) for f in frames))
+    paths = {f: frame_path(output, f, extension) for f in frames}
+    partial_output = _partial_output(output)
+    partial_paths = {f: frame_path(partial_output, f, extension) for f in frames}
+    skipped = [] if overwrite else [f for f in frames if _is_rendered(paths[f])]
+    skipped_set = set(skipped)
+    todo = [f for f in frames if f not in skipped_set]
+
+    cpu_count = os.cpu_count() or 1
+    n_workers = n_workers or max(1, cpu_count // 4)
+    threads_per_worker = threads_per_worker or max(1, cpu_count // n_workers)
+    chunk_size = chunk_size or max(1, math.ceil(len(todo) / (4 * n_workers)))
+    shards = split_frames(todo, chunk_size)
+
+    if verbose:
+        print(f'rendering {len(todo)} frames ({len(skipped)} already on disk) '
+              f'in {len(shards)} shards on {n_workers} workers '
+              f'x {threads_per_worker} threads')
+
+    if log_dir is not None:
+        os.makedirs(log_dir, exist_ok=True)
+
+    results = []
+    lock = threading.Lock()
+    pending = list(enumerate(shards))
+    t_start = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                shard, shard_frames = pending.pop(0)
+            cmd = [blender, '-b', blend_path]
+            if setup_script is not None:
+                cmd += ['--python', os.path.abspath(setup_script)]
+            cmd += ['-o', partial_output, '-t', str(threads_per_worker)]
+            if engine is not None:
+                cmd += ['-E', engine]
+            cmd += list(extra_args) + ['-f', _frames_arg(shard_frames)]
+
+            log = (open(os.path.join(log_dir, f'shard_{shard:04d}.log'), 'w')
+                   if log_dir is not None else None)
+            try:
+                result = _run_shard(
+                    cmd, shard, shard_frames, [paths[f] for f in shard_frames],
+                    [partial_paths[f] for f in shard_frames], log)
+            finally:
+                if log is not None:
+                    log.close()
+            with lock:
+                results.append(result)
+                if verbose:
+                    n_done = sum(len(r['timings']) for r in results)
+                    print(f'shard {shard} done in {result["seconds"]:.1f}s '
+                          f'(return code {result["returncode"]}), '
+                          f'{n_done}/{len(todo)} frames rendered')
+
+    threads = [threading.Thread(target=worker, daemon=True)
+               for _ in range(min(n_workers, len(shards)))]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        # frames left half-written by a failed or interrupted worker
+        for f in todo:
+            if os.path.isfile(partial_paths[f]):
+                os.remove(partial_paths[f])
+
+    timings = sorted((t for r in results for t in r['timings']),
+                     key=lambda t: (t['frame'] is None, t['frame']))
+    rendered = [f for f in todo if _is_rendered(paths[f])]
+    failed = [f for f in todo if not _is_rendered(paths[f])]
+    report = {
+        'blend_path': blend_path,
+        'output': output,
+        'n_workers': n_workers,
+        'threads_per_worker': threads_per_worker,
+        'wall_time': time.perf_counter() - t_start,
+        'rendered': rendered,
+        'skipped': skipped,
+        'failed': failed,
+        'timings': timings,
+        'shards': [{k: v for k, v in r.items() if k != 'timings'} for r in results],
+    }
+
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    if verbose:
+        print(f'rendered {len(rendered)} frames in {report["wall_time"]:.1f}s, '
+              f'{len(failed)} failed')
+    return report
@@ -0,0 +1,203 @@
+import numpy as np
+
+
+def _expand_ranges(starts, counts):
+    """Indices of the concatenated ranges [start, start + count) and the range of each."""
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets, owner
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index over bead coordinates, with vectorized radius
+    and k-nearest-neighbour queries.
+
+    Points are bucketed into cubic cells of edge cell_size and sorted by cell,
+    so a radius query with r <= cell_size only visits the 27 surrounding
+    cells. For trajectories, `update` re-buckets moved coordinates starting
+    from the previous order, which is nearly sorted when beads move little
+    between frames.
+
+    Example:
+        index = GridIndex(d, cell_size=r)
+        i, j = index.query_pairs(r)          # all contacts
+        near = index.within(centers, r)      # beads near any center
+    """
+
+    def __init__(self, points, cell_size, max_memory=2**28):
+        self.cell_size = float(cell_size)
+        self.max_memory = max_memory
+        self._order = None
+        self.update(points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell_ijk(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _encode(self, ijk):
+        ny, nz = self.shape[1], self.shape[2]
+        return (ijk[..., 0] * ny + ijk[..., 1]) * nz + ijk[..., 2]
+
+    def update(self, points):
+        """Re-index moved points (same number of points, or a new set)."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.points = points
+        if len(points) == 0:
+            self.origin = np.zeros(3)
+            self.shape = (1, 1, 1)
+            self._order = np.zeros(0, dtype=np.int64)
+            self.cell_keys = self.cell_starts = self.cell_counts = np.zeros(0, dtype=np.int64)
+            return self
+
+        self.origin = points.min(axis=0)
+        self.shape = tuple(self._cell_ijk(points.max(axis=0)[None])[0] + 1)
+        keys = self._encode(self._cell_ijk(points))
+
+        order = self._order
+        if order is None or len(order) != len(points):
+            order = np.argsort(keys, kind='stable')
+        else:
+            # the previous order is nearly sorted for small displacements
+            order = order[np.argsort(keys[order], kind='stable')]
+        self._order = order
+
+        sorted_keys = keys[order]
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(
+            sorted_keys, return_index=True, return_counts=True)
+        return self
+
+    def _chunk(self, n_per_query):
+        # ~ 6 temporary int64/float64 arrays per candidate
+        return max(1, int(self.max_memory // (max(n_per_query, 1) * 8 * 6)))
+
+    def _candidates(self, queries, reach):
+        """Pairs (query index, point index) for the points in the cells within reach."""
+        span = np.arange(-reach, reach + 1)
+        neighbours = np.stack(np.meshgrid(span, span, span, indexing='ij'), axis=-1).reshape(-1, 3)
+        ijk = self._cell_ijk(queries)[:, None, :] + neighbours[None]
+        inside = np.all((ijk >= 0) & (ijk < np.asarray(self.shape)), axis=-1)
+        q, n = np.nonzero(inside)
+        keys = self._encode(ijk[q, n])
+
+        pos = np.searchsorted(self.cell_keys, keys)
+        pos_clipped = np.minimum(pos, len(self.cell_keys) - 1)
+        found = self.cell_keys[pos_clipped] == keys
+        q, pos = q[found], pos_clipped[found]
+
+        idx, owner = _expand_ranges(self.cell_starts[pos], self.cell_counts[pos])
+        return q[owner], self._order[idx]
+
+    def query_radius(self, queries, r, return_distances=False):
+        """
+        All (query, point) pairs closer than r.
+
+        Returns:
+            query indices and point indices (and distances), sorted by query
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        reach = int(np.ceil(r / self.cell_size))
+        empty = np.zeros(0, dtype=np.int64)
+        if len(self.points) == 0 or len(queries) == 0:
+            return (empty, empty, np.zeros(0)) if return_distances else (empty, empty)
+
+        mean_per_cell = len(self.points) / max(len(self.cell_keys), 1)
+        chunk = self._chunk(mean_per_cell * (2 * reach + 1) ** 3)
+        out_q, out_p, out_d = [], [], []
+        for lo in range(0, len(queries), chunk):
+            q, p = self._candidates(queries[lo:lo + chunk], reach)
+            d2 = ((queries[lo + q] - self.points[p]) ** 2).sum(axis=1)
+            close = d2 < r * r
+            out_q.append(q[close] + lo)
+            out_p.append(p[close])
+            out_d.append(np.sqrt(d2[close]))
+
+        q, p, d = np.concatenate(out_q), np.concatenate(out_p), np.concatenate(out_d)
+        order = np.lexsort((p, q))
+        q, p, d = q[order], p[order], d[order]
+        return (q, p, d) if return_distances else (q, p)
+
+    def query_pairs(self, r, min_separation=0):
+        """
+        All pairs i < j of indexed points closer than r, e.g. contacts.
+        min_separation skips pairs with j - i below it, e.g. bonded neighbours.
+        """
+        i, j = self.query_radius(self.points, r)
+        keep = j - i >= max(min_separation, 1)
+        return i[keep], j[keep]
+
+    def count_within(self, queries, r):
+        """Number of indexed points closer than r to every query."""
+        q, _ = self.query_radius(queries, r)
+        return np.bincount(q, minlength=len(np.asarray(queries).reshape(-1, 3)))
+
+    def within(self, queries, r):
+        """Mask of the indexed points closer than r to any query."""
+        _, p = self.query_radius(queries, r)
+        mask = np.zeros(len(self.points), dtype=bool)
+        mask[p] = True
+        return mask
+
+    def query_knn(self, queries, k):
+        """
+        k nearest indexed points of every query.
+
+        The search widens ring by ring of cells only for the queries that do
+        not yet have k neighbours within the radius covered exactly.
+
+        Returns:
+            (Q, k) point indices and (Q, k) distances, nearest first;
+            -1 and inf where fewer than k points exist
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        n_q = len(queries)
+        indices = np.full((n_q, k), -1, dtype=np.int64)
+        distances = np.full((n_q, k), np.inf)
+        if len(self.points) == 0 or n_q == 0 or k <= 0:
+            return indices, distances
+        k_eff = min(k, len(self.points))
+
+        # the reach at which the visited cells cover the whole grid
+        ijk = self._cell_ijk(queries)
+        max_reach = np.maximum(np.abs(ijk), np.abs(ijk - (np.asarray(self.shape) - 1))).max(axis=1)
+
+        todo = np.arange(n_q)
+        reach = 1
+        while len(todo):
+            q, p = self._candidates(queries[todo], reach)
+            d = np.sqrt(((queries[todo][q] - self.points[p]) ** 2).sum(axis=1))
+            order = np.lexsort((d, q))
+            q, p, d = q[order], p[order], d[order]
+
+            # rank of every candidate within its query
+            starts = np.searchsorted(q, np.arange(len(todo)))
+            rank = np.arange(len(q)) - starts[q]
+            first_k = rank < k_eff
+            counts = np.bincount(q[first_k], minlength=len(todo))
+
+            # a neighbour is certain if closer than the distance fully covered
+            # by the visited cells
+            covered = reach * self.cell_size
+            kth = np.full(len(todo), np.inf)
+            has_k = counts >= k_eff
+            kth_pos = starts[has_k] + k_eff - 1
+            kth[has_k] = d[kth_pos]
+            done = has_k & (kth <= covered) | (reach >= max_reach[todo])
+
+            sel = first_k & done[q]
+            rows = todo[q[sel]]
+            indices[rows, rank[sel]] = p[sel]
+            distances[rows, rank[sel]] = d[sel]
+
+            todo = todo[~done]
+            reach += 1
+        return indices, distances
+
+
+def contacts(points, r, cell_size=None, min_separation=1):
+    """Pairs i < j of points closer than r, skipping |i - j| < min_separation."""
+    index = GridIndex(points, cell_size or r)
+    return index.query_pairs(r, min_separation=min_separation)
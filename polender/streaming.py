@@ -0,0 +1,357 @@
+import weakref
+import itertools
+
+import numpy as np
+
+import bpy
+
+from .objects import add_curve
+from .framecache import FrameCache
+from .interpolate import TrajectoryInterpolator
+
+
+_token_counter = itertools.count()
+# id(obj) -> (reference to obj, token)
+_tokens = {}
+
+
+def identity_token(obj):
+    """
+    A token identifying obj for as long as it is alive; unlike id(obj), it is
+    never reused by another object after obj is garbage collected.
+    """
+    entry = _tokens.get(id(obj))
+    if entry is not None and entry[0]() is obj:
+        return entry[1]
+    token = next(_token_counter)
+    key = id(obj)
+    try:
+        ref = weakref.ref(obj, lambda _, key=key: _tokens.pop(key, None))
+    except TypeError:
+        # not weakly referenceable: keep obj alive, so its id is not reused
+        ref = (lambda obj: lambda: obj)(obj)
+    _tokens[key] = (ref, token)
+    return token
+
+
+class FrameSource:
+    """
+    A trajectory that can be read one frame at a time.
+
+    Wraps a GSDTrajectory (or any object with `positions(frame)` and `len()`),
+    an (F, N, 3) array or a callable frame -> (N, 3) coordinates, optionally
+    followed by a transform (e.g. unwrapping, centering, scaling) applied to
+    every fetched frame.
+
+    `key` identifies the trajectory and its transform pipeline in a
+    FrameCache; by default it is derived from the file path (or identity
+    token) of the trajectory and the identity token of the transform.
+    """
+
+    def __init__(self, source, n_frames=None, transform=None, key=None):
+        if isinstance(source, FrameSource):
+            if transform is None:
+                transform = source.transform
+            if n_frames is None:
+                n_frames = source.n_frames
+            source = source.source
+        self.source = source
+        self.transform = transform
+        self.key = key if key is not None else (
+            getattr(source, 'path', None) or identity_token(source),
+            None if transform is None else identity_token(transform))
+
+        if hasattr(source, 'positions'):
+            self._read = source.positions
+        elif callable(source):
+            self._read = source
+        else:
+            self.source = np.asarray(source)
+            self._read = self.source.__getitem__
+
+        if n_frames is None:
+            if not hasattr(self.source, '__len__'):
+                raise ValueError("n_frames must be given for a callable source")
+            n_frames = len(self.source)
+        self.n_frames = int(n_frames)
+
+    def __len__(self):
+        return self.n_frames
+
+    def clamp(self, frame):
+        return min(max(int(frame), 0), self.n_frames - 1)
+
+    def read(self, frame):
+        """(N, 3) coordinates of a trajectory frame, transformed."""
+        d = self._read(self.clamp(frame))
+        if self.transform is not None:
+            d = self.transform(d)
+        return np.asarray(d)
+
+
+def interpolated_source(source, frame_step, method='linear', times=None, window=4):
+    """
+    A FrameSource with frame_step output frames per frame of source,
+    interpolated in between with TrajectoryInterpolator, e.g. to play
+    sparse simulation snapshots smoothly at one snapshot per frame_step
+    scene frames. 'cubic' is solved over `window` frames on either side of
+    the current one, so that memory stays bounded by a few frames.
+    """
+    source = FrameSource(source)
+    interp = TrajectoryInterpolator(
+        source, times=times, method=method, window=window if method == 'cubic' else None)
+    t0, t1 = interp.times[0], interp.times[-1]
+    n_frames = int(round((t1 - t0) * frame_step)) + 1
+    return FrameSource(
+        lambda frame: interp(t0 + frame / frame_step),
+        n_frames=n_frames,
+        key=(source.key, method, frame_step, window if method == 'cubic' else None))
+
+
+def write_coords(obj, coords):
+    """
+    Write (N, 3) coordinates into the points of a curve or the vertices of a
+    mesh with one foreach_set per spline. The points of consecutive splines
+    take consecutive rows of coords.
+    """
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+    data = obj.data
+
+    if obj.type == 'MESH':
+        data.vertices.foreach_set('co', coords.ravel())
+        data.update()
+        return
+
+    if obj.type != 'CURVE':
+        raise ValueError(f"cannot stream coordinates into an object of type {obj.type}")
+
+    lo = 0
+    for spline in data.splines:
+        if spline.type == 'BEZIER':
+            points = spline.bezier_points
+            co = coords[lo:lo + len(points)].ravel()
+            points.foreach_set('co', co)
+            # auto handles are recomputed from co; free handles collapse onto co
+            if len(points) and points[0].handle_left_type in ('FREE', 'ALIGNED'):
+                points.foreach_set('handle_left', co)
+                points.foreach_set('handle_right', co)
+        else:
+            points = spline.points
+            co = np.ones((len(points), 4), dtype=np.float32)
+            co[:, :3] = coords[lo:lo + len(points)]
+            points.foreach_set('co', co.ravel())
+        lo += len(points)
+    data.update_tag()
+
+
+class TrajectoryStream:
+    """
+    Plays a trajectory on an object: on every frame change, the coordinates of
+    the matching trajectory frame are written into the object's points.
+
+    Trajectory frame i is shown at scene frames
+    [frame_start + i * frame_step, frame_start + (i + 1) * frame_step).
+
+    `indices` selects the beads of every trajectory frame shown by the object,
+    e.g. slice(*chain) for one chain of a multi-chain snapshot.
+    """
+
+    def __init__(self, obj, source, frame_start=1, frame_step=1, indices=None):
+        self.obj_name = obj.name
+        self.source = source
+        self.frame_start = frame_start
+        self.frame_step = frame_step
+        self.indices = indices
+        self.last_frame = None
+
+    @property
+    def obj(self):
+        return bpy.data.objects.get(self.obj_name)
+
+    def traj_frame(self, scene_frame):
+        return self.source.clamp((scene_frame - self.frame_start) // self.frame_step)
+
+    def update(self, scene_frame, read=None):
+        obj = self.obj
+        if obj is None:
+            return False
+        frame = self.traj_frame(scene_frame)
+        if frame == self.last_frame:
+            return True
+
+        d = self.source.read(frame) if read is None else read(self.source, frame)
+        if self.indices is not None:
+            d = d[self.indices]
+        write_coords(obj, d)
+        self.last_frame = frame
+        return True
+
+
+_streams = {}
+_frame_cache = None
+
+
+def _read_once(cache):
+    # several objects often show slices of the same trajectory frame
+    def read(source, frame):
+        key = (source.key, frame)
+        if key not in cache:
+            cache[key] = (source.read(frame) if _frame_cache is None
+                          else _frame_cache.get(source, frame))
+        return cache[key]
+    return read
+
+
+def set_frame_cache(max_bytes=2**30, n_prefetch=8):
+    """
+    Cache streamed frames in an LRU cache of max_bytes and prefetch the next
+    n_prefetch frames in the playback direction in a background thread,
+    for smooth scrubbing of large trajectories. max_bytes=0 disables caching.
+
+    Returns:
+        the FrameCache, or None if disabled
+    """
+    global _frame_cache
+    if _frame_cache is not None:
+        _frame_cache.close()
+    _frame_cache = (FrameCache(max_bytes=max_bytes, n_prefetch=n_prefetch)
+                    if max_bytes > 0 else None)
+    return _frame_cache
+
+
+def get_frame_cache():
+    return _frame_cache
+
+
+@bpy.app.handlers.persistent
+def _on_frame_change(scene, depsgraph=None):
+    read = _read_once({})
+    playheads = {}
+    for name, stream in list(_streams.items()):
+        prev_frame = stream.last_frame
+        if not stream.update(scene.frame_current, read=read):
+            # the object was deleted
+            del _streams[name]
+            continue
+        if prev_frame is not None and stream.last_frame != prev_frame:
+            direction = 1 if stream.last_frame > prev_frame else -1
+            playheads[stream.source.key] = (stream.source, stream.last_frame, direction)
+
+    if _frame_cache is not None:
+        for source, frame, direction in playheads.values():
+            _frame_cache.prefetch(source, frame, direction)
+
+
+def _install_stream_handler():
+    # drop handlers left over from a previous import of this module
+    handlers = bpy.app.handlers.frame_change_pre
+    for h in list(handlers):
+        if getattr(h, '__name__', None) == _on_frame_change.__name__:
+            handlers.remove(h)
+    handlers.append(_on_frame_change)
+
+
+_install_stream_handler()
+
+
+def stream_trajectory(
+        obj,
+        source,
+        frame_start=1,
+        frame_step=1,
+        indices=None,
+        n_frames=None,
+        transform=None,
+        interpolation=None,
+        set_frame_range=False):
+    """
+    Animate the points of a curve or mesh from a trajectory without keyframes.
+
+    A frame_change_pre handler reads the current trajectory frame and writes
+    it into the object with foreach_set, so memory stays proportional to one
+    frame regardless of the trajectory length. For rendering from the UI,
+    enable Render > Lock Interface to keep the handler in sync with the render.
+
+    Args:
+        obj: curve or mesh object with as many points as the selected beads
+        source: GSDTrajectory, (F, N, 3) array, callable frame -> (N, 3)
+            or FrameSource
+        frame_start: scene frame that shows the first trajectory frame
+        frame_step: scene frames per trajectory frame
+        indices: optional slice or index array of the beads shown by obj
+        n_frames: number of trajectory frames, required for callables
+        transform: optional function applied to every fetched (N, 3) frame
+        interpolation: None to hold every trajectory frame for frame_step
+            scene frames, or 'linear', 'cubic' or 'catmull_rom' to
+            interpolate the scene frames in between
+        set_frame_range: set the scene frame range to span the trajectory
+
+    Returns:
+        TrajectoryStream
+    """
+    if not isinstance(source, FrameSource) or n_frames is not None or transform is not None:
+        source = FrameSource(source, n_frames=n_frames, transform=transform)
+    if interpolation is not None:
+        source = interpolated_source(source, frame_step, method=interpolation)
+        frame_step = 1
+    stream = TrajectoryStream(
+        obj, source, frame_start=frame_start, frame_step=frame_step, indices=indices)
+    _streams[obj.name] = stream
+
+    scene = bpy.context.scene
+    if set_frame_range:
+        scene.frame_start = frame_start
+        scene.frame_end = frame_start + len(source) * frame_step - 1
+    stream.update(scene.frame_current)
+    return stream
+
+
+def stop_streaming(obj=None):
+    """Stop streaming into obj, or into all objects. The current pose is kept."""
+    if obj is None:
+        _streams.clear()
+    else:
+        _streams.pop(obj.name, None)
+
+
+def get_streams():
+    return dict(_streams)
+
+
+def create_streamed_curve(
+        source,
+        thickness=0.2,
+        name='polymer',
+        resolution=4,
+        kind='BEZIER',
+        frame_start=1,
+        frame_step=1,
+        indices=None,
+        n_frames=None,
+        transform=None,
+        interpolation=None,
+        collection=None):
+    """
+    Streaming counterpart of `create_animated_curve`: a curve that follows
+    a trajectory frame by frame without storing any keyframes.
+
+    Returns:
+        curve data, curve object and the TrajectoryStream
+    """
+    source = FrameSource(source, n_frames=n_frames, transform=transform)
+    d = source.read(0)
+    if indices is not None:
+        d = d[indices]
+
+    curve, obj = add_curve(
+        np.asarray(d, dtype=np.float64),
+        thickness=thickness,
+        name=name,
+        resolution=resolution,
+        kind=kind,
+        collection=collection)
+
+    stream = stream_trajectory(
+        obj, source, frame_start=frame_start, frame_step=frame_step, indices=indices,
+        interpolation=interpolation)
+    return curve, obj, stream
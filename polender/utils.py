@@ -1,30 +1,149 @@
 import re
+import contextlib
+import functools
+
+import numpy as np
 
 import bpy
+from mathutils import Matrix
+
+from .geoutils import set_loc_rot_batch
 
 
 def clone_obj(obj):
-    bpy.context.scene.objects.active = obj
-    bpy.ops.object.select_all(action='DESELECT')
-    obj.select = True
-    bpy.ops.object.duplicate(linked=True)
-    return bpy.context.scene.objects.active
+    return clone_objects(obj, 1)[0]
 
 
-def matches_template(template, string, pattern_type='any'):
-    # Convert format template to regex pattern
-    pattern = re.escape(template) 
-    if pattern_type == 'numbers':
-        replacement = r'(\\d+)'  # Capture group added
-    elif pattern_type == 'any':
-        replacement = r'(.*?)'   # Capture group added
-    elif pattern_type == 'word':
-        replacement = r'(\\w+)'  # Capture group added
+def _instance_source_collection(obj):
+    if isinstance(obj, bpy.types.Collection):
+        return obj
+    name = f'{obj.name}_instance_src'
+    src = bpy.data.collections.get(name)
+    if src is None:
+        # not linked to any scene: only rendered through its instances
+        src = bpy.data.collections.new(name)
+        src.objects.link(obj)
+        # instances are placed relative to the object, not to the world origin
+        src.instance_offset = obj.matrix_world.translation
+    return src
+
+
+def clone_objects(
+        obj,
+        n=None,
+        matrices=None,
+        locations=None,
+        rotations=None,
+        scales=None,
+        mode='LINKED',
+        collection=None,
+        name=None):
+    """
+    Create many copies of an object in one call, without bpy.ops.
+
+    Args:
+        obj: the object to copy, or a collection for mode='INSTANCE'
+        n: number of copies; inferred from the transforms if not given
+        matrices: (K, 4, 4) world matrices of the copies
+        locations: (K, 3) locations, used if matrices are not given
+        rotations: (K, 3) Euler angles or (K, 4) (w, x, y, z) quaternions
+        scales: (K, 3) scales
+        mode: 'LINKED' - copies share the data (mesh, curve...) of obj,
+              'FULL' - every copy gets its own copy of the data,
+              'INSTANCE' - empties instancing a collection with obj, the
+              cheapest option for thousands of copies
+        collection: collection (or its name) to link the copies to; by
+            default, the first collection of obj other than the hidden
+            source collection of its instances, or the active collection
+        name: name of the copies; Blender adds numeric suffixes. By default,
+            copies are named like obj
+
+    Returns:
+        list of the new objects
+    """
+    transforms = [t for t in (matrices, locations, rotations, scales) if t is not None]
+    if n is None:
+        if not transforms:
+            raise ValueError("either n or the transforms of the copies must be given")
+        n = len(transforms[0])
+    if any(len(t) != n for t in transforms):
+        raise ValueError("all transforms must have one entry per copy")
+
+    if isinstance(collection, str):
+        collection = bpy.data.collections[collection]
+    if collection is None:
+        collection = bpy.context.collection
+        if isinstance(obj, bpy.types.Object):
+            src_name = f'{obj.name}_instance_src'
+            collection = next((c for c in obj.users_collection if c.name != src_name),
+                              collection)
+
+    # maps the world matrix of an instance to that of the object it shows
+    instance_correction = None
+    if mode == 'INSTANCE':
+        src_collection = _instance_source_collection(obj)
+        name = name or f'{src_collection.name}_instance'
+        if isinstance(obj, bpy.types.Object):
+            placed = Matrix.Translation(-src_collection.instance_offset) @ obj.matrix_world
+            if placed != Matrix.Identity(4):
+                instance_correction = placed.inverted()
+    elif mode not in ('LINKED', 'FULL'):
+        raise ValueError("mode must be 'LINKED', 'FULL' or 'INSTANCE'")
+
+    new_objs = []
+    for i in range(n):
+        if mode == 'INSTANCE':
+            new = bpy.data.objects.new(name, None)
+            new.instance_type = 'COLLECTION'
+            new.instance_collection = src_collection
+        else:
+            new = obj.copy()
+            if mode == 'FULL' and obj.data is not None:
+                new.data = obj.data.copy()
+            if name is not None:
+                new.name = name
+        collection.objects.link(new)
+        new_objs.append(new)
+
+    if matrices is not None:
+        for new, m in zip(new_objs, np.asarray(matrices, dtype=np.float64)):
+            new.matrix_world = Matrix(m.tolist())
     else:
+        set_loc_rot_batch(new_objs, locations, rotations)
+        if scales is not None:
+            for new, scale in zip(new_objs, np.asarray(scales, dtype=np.float64).tolist()):
+                new.scale = scale
+
+    if instance_correction is not None:
+        # instances show obj at the given transforms, like LINKED and FULL copies
+        for new in new_objs:
+            new.matrix_basis = new.matrix_basis @ instance_correction
+
+    return new_objs
+
+
+HOOK_CHAIN_PROP = 'polender_chain'
+HOOK_INDEX_PROP = 'polender_hook_index'
+HOOK_MODIFIERS_PROP = 'polender_hook_modifiers'
+
+_PATTERN_GROUPS = {
+    'numbers': r'(\d+)',
+    'any': r'(.*?)',
+    'word': r'(\w+)',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(template, pattern_type='any'):
+    """Convert a format template, e.g. 'hook_{}_empty', into a compiled regex."""
+    if pattern_type not in _PATTERN_GROUPS:
         raise ValueError("Invalid pattern_type. Use 'numbers', 'any', or 'word'")
-    pattern = str.format(template, replacement)
-    pattern = '^' + pattern + '$'
-    match = re.match(pattern, string)
+    parts = [re.escape(part) for part in template.split('{}')]
+    return re.compile('^' + _PATTERN_GROUPS[pattern_type].join(parts) + '$')
+
+
+def matches_template(template, string, pattern_type='any'):
+    match = compile_template(template, pattern_type).match(string)
     if match:
         # Return all captured groups
         if len(match.groups()) == 1:
@@ -33,26 +152,235 @@ def matches_template(template, string, pattern_type='any'):
     return None
 
 
+def natural_sort_key(key):
+    """Sort key that orders 'hook_2' before 'hook_10'."""
+    if isinstance(key, tuple):
+        return tuple(natural_sort_key(k) for k in key)
+    if isinstance(key, str):
+        return tuple((0, int(tok), '') if tok.isdigit() else (1, 0, tok)
+                     for tok in re.split(r'(\d+)', key) if tok)
+    return ((0, key, ''),)
+
+
+_discovery_cache = {}
+
+
+def clear_discovery_cache(*args):
+    _discovery_cache.clear()
+
+
+@bpy.app.handlers.persistent
+def _invalidate_discovery_cache(scene, depsgraph=None):
+    if depsgraph is None or depsgraph.id_type_updated('OBJECT'):
+        _discovery_cache.clear()
+
+
+_cache_handlers_installed = False
+
+
+def install_cache_handlers():
+    """
+    Clear the discovery cache on depsgraph updates and file loads, e.g. to
+    also catch changed custom properties in interactive sessions. Called on
+    the first cached discovery; the cache is valid without it.
+    """
+    global _cache_handlers_installed
+    # drop handlers left over from a previous import of this module
+    for handlers in (bpy.app.handlers.depsgraph_update_post, bpy.app.handlers.load_post):
+        for h in list(handlers):
+            if getattr(h, '__name__', None) == _invalidate_discovery_cache.__name__:
+                handlers.remove(h)
+    bpy.app.handlers.depsgraph_update_post.append(_invalidate_discovery_cache)
+    bpy.app.handlers.load_post.append(_invalidate_discovery_cache)
+    _cache_handlers_installed = True
+
+
+_bulk_edit_depth = 0
+
+
+@contextlib.contextmanager
+def bulk_edit(restore_frame=True):
+    """
+    Context manager (or decorator) restoring the interactive state after a
+    build that goes through bpy.ops: on exit it restores the object mode,
+    the active object, the selection and the current frame. Nested bulk
+    edits are no-ops, so polender's builders can use it while being called
+    from a larger build.
+
+    It does not make the build faster: operators called from Python push no
+    undo steps, and Blender has no API to suspend depsgraph evaluation.
+    """
+    global _bulk_edit_depth
+    if _bulk_edit_depth > 0:
+        _bulk_edit_depth += 1
+        try:
+            yield
+        finally:
+            _bulk_edit_depth -= 1
+        return
+
+    context = bpy.context
+    scene = context.scene
+    view_layer = context.view_layer
+    active = view_layer.objects.active
+    active_name = active.name if active is not None else None
+    mode = active.mode if active is not None else 'OBJECT'
+    selected_names = [obj.name for obj in context.selected_objects]
+    frame = scene.frame_current
+
+    _bulk_edit_depth += 1
+    try:
+        yield
+    finally:
+        _bulk_edit_depth -= 1
+        if context.mode != 'OBJECT' and view_layer.objects.active is not None:
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        for obj in context.selected_objects:
+            obj.select_set(False)
+        for name in selected_names:
+            obj = bpy.data.objects.get(name)
+            if obj is not None and obj.name in view_layer.objects:
+                obj.select_set(True)
+
+        active = bpy.data.objects.get(active_name) if active_name else None
+        view_layer.objects.active = (
+            active if active is not None and active.name in view_layer.objects else None)
+        if active is not None and mode != 'OBJECT' and view_layer.objects.active is active:
+            bpy.ops.object.mode_set(mode=mode)
+
+        if restore_frame and scene.frame_current != frame:
+            scene.frame_set(frame)
+
+
+def _names_fingerprint(root):
+    # changes when objects are added, removed or renamed; depsgraph handlers
+    # do not run in the middle of a script, so the cache cannot rely on them
+    return hash(tuple(root.objects.keys()))
+
+
+def _cached(key, root, build):
+    if not _cache_handlers_installed:
+        install_cache_handlers()
+    fingerprint = _names_fingerprint(root)
+    cached = _discovery_cache.get(key)
+    if cached is not None:
+        cached_fingerprint, objs = cached
+        if cached_fingerprint == fingerprint:
+            try:
+                for obj in objs.values():
+                    obj.name
+                return dict(objs)
+            except ReferenceError:
+                pass
+    objs = build()
+    _discovery_cache[key] = (fingerprint, objs)
+    return dict(objs)
+
+
 def discover_objects(
         name_filter='{}',
         obj_type='MESH',
-        root=bpy.data,
+        root=None,
+        pattern_type='any',
+        use_cache=True,
 ):
-    objs = {}
-    
+    """
+    Find objects whose names match a template, e.g. 'hook_{}_empty'.
+
+    Args:
+        name_filter: a format template with one or more '{}' fields, or a
+            callable that returns the key of an object from its name (or None)
+        obj_type: type of the objects to return, or None for any type
+        root: where to look for objects, bpy.data by default; can also be
+            a collection
+        pattern_type: what a '{}' field matches: 'any', 'numbers' or 'word'
+        use_cache: reuse the result of an identical earlier call, as long
+            as no objects have been added, removed or renamed since, as
+            checked against a hash of the object names
+
+    Returns:
+        dict {key: object}, sorted by key in natural order (2 before 10)
+    """
+    root = bpy.data if root is None else root
+
     if isinstance(name_filter, str):
-        if '{}' in name_filter:
-            name_filter_func = lambda name: matches_template(name_filter, name)
+        regex = compile_template(name_filter, pattern_type)
+        def name_filter_func(name):
+            match = regex.match(name)
+            if match is None:
+                return None
+            return match.group(1) if len(match.groups()) == 1 else match.groups()
     elif hasattr(name_filter, '__call__'):
         name_filter_func = name_filter
+        use_cache = False
     else:
         raise ValueError("name_filter must be a string or a callable function")
-    
-    for obj in root.objects:
-        idx = name_filter_func(obj.name)
-        if not (idx is False or idx is None):
-            if obj_type is None or obj.type == obj_type:
+
+    def build():
+        objs = {}
+        for obj in root.objects:
+            if obj_type is not None and obj.type != obj_type:
+                continue
+            idx = name_filter_func(obj.name)
+            if not (idx is False or idx is None):
                 objs[idx] = obj
-        
-    objs = dict(sorted(list(objs.items()), key=lambda x:x[0]))
-    return objs
+        return dict(sorted(objs.items(), key=lambda x: natural_sort_key(x[0])))
+
+    if not use_cache:
+        return build()
+    return _cached(('objects', name_filter, obj_type, pattern_type, root.as_pointer()
+                    if hasattr(root, 'as_pointer') else id(root)), root, build)
+
+
+def stamp_hook(hook, chain_name, idx):
+    """Store the chain and the index of a hook in its custom properties."""
+    hook[HOOK_CHAIN_PROP] = chain_name
+    hook[HOOK_INDEX_PROP] = idx
+
+
+def stamp_hook_modifiers(obj, modifier_names):
+    """Store the names of the hook modifiers of a chain object, in hook order."""
+    obj[HOOK_MODIFIERS_PROP] = list(modifier_names)
+
+
+def discover_hook_modifiers(obj, idxs=None):
+    """
+    Hook modifiers of a chain object, from the names stamped by
+    make_hooked_chain, optionally only those of the hooks idxs; objects
+    without the stamp fall back to all their HOOK modifiers.
+    """
+    names = obj.get(HOOK_MODIFIERS_PROP)
+    if names is None:
+        mods = [mod for mod in obj.modifiers if mod.type == 'HOOK']
+        return mods if idxs is None else [mods[i] for i in idxs]
+    names = list(names)
+    if idxs is not None:
+        names = [names[i] for i in idxs]
+    mods = (obj.modifiers.get(name) for name in names)
+    return [mod for mod in mods if mod is not None]
+
+
+def discover_hooks(chain_name, root=None, use_cache=True):
+    """
+    Recover the hooks of a chain created by make_hooked_chain from the custom
+    properties stamped on them, independent of their names.
+    Restamping existing objects without adding or renaming any is not seen
+    by the cache within a running script; pass use_cache=False then.
+
+    Returns:
+        list of hooks, ordered by their index along the chain
+    """
+    root = bpy.data if root is None else root
+
+    def build():
+        hooks = {}
+        for obj in root.objects:
+            if obj.get(HOOK_CHAIN_PROP) == chain_name:
+                hooks[obj[HOOK_INDEX_PROP]] = obj
+        return dict(sorted(hooks.items()))
+
+    if not use_cache:
+        return list(build().values())
+    key = ('hooks', chain_name, root.as_pointer() if hasattr(root, 'as_pointer') else id(root))
+    return list(_cached(key, root, build).values())